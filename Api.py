@@ -1,16 +1,261 @@
-from fastapi import FastAPI
-import subprocess
-import uvicorn
-import os
-
-app = FastAPI()
-
-@app.get("/")
-def start_streamlit():
-    # Run Streamlit as a subprocess
-    streamlit_command = "streamlit run ui.py --server.port=8501 --server.address=0.0.0.0"
-    subprocess.Popen(streamlit_command, shell=True)
-    return {"message": "Streamlit app started on port 8501"}
-
-if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+from contextlib import asynccontextmanager, nullcontext
+from typing import List, Optional
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from pydantic import ConfigDict, create_model
+from starlette.concurrency import run_in_threadpool
+import pandas as pd
+import uvicorn
+import json
+import os
+import time
+
+from fraud_detector import get_detector
+from model_registry import ReloadError, get_registry
+from micro_batcher import MicroBatcher, DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT
+from pattern_retriever import get_retriever, load_embedder
+from explanation_policy import policy as explanation_policy, LLM, ON_DEMAND
+import llm_scheduler
+from startup import startup_report
+import telemetry
+
+# Largest batch accepted by /score/batch
+MAX_BATCH_SIZE = 10000
+
+# Coalescing of concurrent /score requests into one model call (a window of 0 disables it)
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", DEFAULT_MAX_BATCH_SIZE))
+MICRO_BATCH_WINDOW_MS = float(os.getenv("MICRO_BATCH_WINDOW_MS", DEFAULT_MAX_WAIT * 1000))
+
+# When set, /admin endpoints require it in the X-Admin-Token header
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# The request schema is built from the model's own feature list
+with open("models/model_metadata.json", "r") as f:
+    FEATURE_NAMES = json.load(f)["feature_names"]
+
+# Amount is required (the model takes it unscaled); V-features default to 0.0 when omitted
+Transaction = create_model(
+    "Transaction",
+    __config__=ConfigDict(extra="forbid"),
+    **{
+        feature: (float, ...) if feature == "Amount" else (Optional[float], None)
+        for feature in FEATURE_NAMES
+    }
+)
+
+# The detector itself is taken from the model registry per request (see model_registry.py)
+batcher = None
+# Set once this process's model is warm, cleared while shutting down (see /ready)
+ready = False
+
+def preload():
+    """
+    Load what every worker shares, without running inference. The pre-fork
+    master (gunicorn.conf.py) calls this so workers inherit the pages.
+    """
+    get_detector()
+    # Pattern embeddings for ranking explanation context (no model is loaded here)
+    get_retriever()
+
+@asynccontextmanager
+async def lifespan(app):
+    global batcher, ready
+    preload()
+    await run_in_threadpool(get_detector().warm_up)
+    # The embedding model behind ?explain's pattern ranking, loaded here rather than by the first request
+    await run_in_threadpool(load_embedder)
+    # Watch models/ for new artifacts from here, after any pre-fork
+    get_registry().start()
+    if MICRO_BATCH_WINDOW_MS > 0:
+        batcher = MicroBatcher(get_detector, MICRO_BATCH_MAX_SIZE, MICRO_BATCH_WINDOW_MS / 1000)
+        await batcher.start()
+    ready = True
+    yield
+    ready = False
+    get_registry().stop()
+    if batcher is not None:
+        await batcher.stop()
+    llm_scheduler.shutdown()
+
+app = FastAPI(title="FraudShield AI", lifespan=lifespan)
+
+@app.middleware("http")
+async def add_timing_header(request: Request, call_next):
+    start = time.perf_counter()
+    # Scoring requests get a trace line when TRACE_LOG is set
+    traced = request.url.path.startswith("/score")
+    with telemetry.trace("http", path=request.url.path) if traced else nullcontext():
+        response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    response.headers["X-Process-Time-Ms"] = f"{elapsed * 1000:.3f}"
+    route = request.scope.get("route")
+    if telemetry.ENABLED and route is not None:
+        telemetry.observe(f"http {route.path}", elapsed)
+    return response
+
+def _to_dict(transaction):
+    return transaction.model_dump(exclude_none=True)
+
+def _pattern_names(patterns):
+    return [f"{p['feature']} {p['condition']}" for p in patterns]
+
+@app.get("/")
+def status():
+    return {"status": "ok", "model_loaded": ready, "features": FEATURE_NAMES}
+
+@app.get("/ready")
+def readiness():
+    # Readiness probe: only passes once the model is loaded and warm
+    if not ready:
+        raise HTTPException(status_code=503, detail="Model is not ready")
+    return {"ready": True, "model_version": get_detector().model_version, "pid": os.getpid()}
+
+def _check_admin_token(token):
+    if ADMIN_TOKEN and token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.get("/admin/model")
+def model_status(x_admin_token: Optional[str] = Header(None)):
+    _check_admin_token(x_admin_token)
+    return {**get_registry().status(), "pid": os.getpid()}
+
+@app.post("/admin/reload")
+async def reload_model(force: bool = False, x_admin_token: Optional[str] = Header(None)):
+    # Reloads this worker only; with several workers, each one's watcher picks up the files
+    _check_admin_token(x_admin_token)
+    try:
+        report = await run_in_threadpool(get_registry().reload, force)
+    except ReloadError as e:
+        raise HTTPException(status_code=422, detail=f"Model rejected: {e}")
+    return {**report, "pid": os.getpid()}
+
+@app.get("/startup")
+def startup():
+    return startup_report()
+
+@app.get("/metrics")
+def metrics():
+    # Prometheus text exposition format
+    return Response(telemetry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/metrics/explanations")
+def explanation_metrics():
+    return explanation_policy.stats()
+
+@app.get("/metrics/llm")
+def llm_metrics():
+    return llm_scheduler.get_scheduler().metrics() if llm_scheduler.ENABLED else {"enabled": False}
+
+@app.get("/metrics/cache")
+def cache_metrics():
+    cache = get_detector().cache
+    return cache.stats() if cache is not None else {"enabled": False}
+
+@app.get("/metrics/explanation_cache")
+def explanation_cache_metrics():
+    from llm_chain import explanation_cache
+
+    return explanation_cache.stats()
+
+@app.get("/metrics/batching")
+def batching_metrics():
+    return batcher.metrics() if batcher is not None else {"enabled": False}
+
+@app.post("/score")
+async def score(transaction: Transaction, response: Response, explain: bool = False):
+    start = time.perf_counter()
+    data = _to_dict(transaction)
+    if batcher is not None:
+        fraud_result, patterns = await batcher.submit(data)
+    else:
+        fraud_result, patterns = await run_in_threadpool(get_detector().score, data)
+    if "error" in fraud_result:
+        raise HTTPException(status_code=500, detail=fraud_result["error"])
+    response.headers["X-Score-Time-Ms"] = f"{(time.perf_counter() - start) * 1000:.3f}"
+
+    result = {**fraud_result, "patterns": _pattern_names(patterns)}
+    if explain:
+        # Imported on demand so pure scoring never loads the LLM stack
+        from llm_chain import aprocess_transaction
+
+        # An explicit ?explain=true always gets the LLM
+        explanation_policy.record(ON_DEMAND)
+        start = time.perf_counter()
+        try:
+            result["llm_explanation"] = await aprocess_transaction(
+                data, fraud_result, patterns, is_borderline=bool(fraud_result.get("is_borderline", False))
+            )
+        except llm_scheduler.SchedulerBusy as e:
+            # Backpressure: the client should retry the explanation later
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+        response.headers["X-Explain-Time-Ms"] = f"{(time.perf_counter() - start) * 1000:.3f}"
+    return result
+
+def _score_records(detector, transactions, top_k):
+    """
+    The blocking part of /score/batch, run in a worker thread: the
+    transactions as dicts, their scores and their matching patterns.
+    """
+    records = [_to_dict(t) for t in transactions]
+    # Omitted features are NaN for pattern matching and zero-filled for the model, as in predict
+    frame = pd.DataFrame.from_records(records, columns=FEATURE_NAMES)
+    with telemetry.stage("predict_batch"):
+        scores = detector.predict_batch(frame.fillna(0.0), top_k=top_k)
+    with telemetry.stage("patterns_batch"):
+        patterns = detector.pattern_matcher.match_records(frame)
+    return records, scores, patterns
+
+@app.post("/score/batch")
+async def score_batch(transactions: List[Transaction], response: Response, explain: bool = False,
+                      drivers: bool = False):
+    if len(transactions) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch size exceeds {MAX_BATCH_SIZE}")
+
+    start = time.perf_counter()
+    # One version for the whole batch, even if a reload lands meanwhile
+    detector = get_detector()
+    # Feature contributions cost a few times the plain prediction, so they are opt-in (explanations need them)
+    top_k = detector.top_drivers if drivers or explain else 0
+    # Scored off the event loop, so concurrent /score requests and the micro-batcher keep running
+    records, scores, patterns = await run_in_threadpool(_score_records, detector, transactions, top_k)
+    telemetry.count("requests", len(records))
+    telemetry.count("fraud", int(scores["fraud"].sum()))
+    telemetry.count("borderline", int(scores["is_borderline"].sum()))
+    response.headers["X-Score-Time-Ms"] = f"{(time.perf_counter() - start) * 1000:.3f}"
+
+    results = [
+        {
+            "fraud": bool(fraud),
+            "confidence": float(confidence),
+            "is_borderline": bool(is_borderline),
+            "patterns": _pattern_names(row_patterns),
+            "model_version": detector.model_version,
+        }
+        for fraud, confidence, is_borderline, row_patterns in zip(
+            scores["fraud"], scores["confidence"], scores["is_borderline"], patterns
+        )
+    ]
+    if "drivers" in scores:
+        for result, row_drivers in zip(results, scores["drivers"]):
+            result["drivers"] = row_drivers
+
+    if explain:
+        from llm_chain import aprocess_transactions
+
+        # Only the LLM tier is explained in the batch; others can be requested one by one via /score
+        for result in results:
+            result["explanation_tier"] = explanation_policy.choose(result)
+        selected = [i for i, result in enumerate(results) if result["explanation_tier"] == LLM]
+
+        start = time.perf_counter()
+        explanations = await aprocess_transactions([
+            {"transaction": records[i], "fraud_result": results[i], "patterns": patterns[i],
+             "is_borderline": results[i]["is_borderline"]}
+            for i in selected
+        ])
+        for i, explanation in zip(selected, explanations):
+            results[i]["llm_explanation"] = explanation
+        response.headers["X-Explain-Time-Ms"] = f"{(time.perf_counter() - start) * 1000:.3f}"
+    return results
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="0.0.0.0", port=8000)
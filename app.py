@@ -1,10 +1,17 @@
 import streamlit as st
-from fraud_detector import FraudDetector
-from workflow import fraud_workflow
+from fraud_detector import format_drivers
+from model_registry import get_registry
+import workflow
+from batch_scoring import BatchSummary, RESULT_VIEWS, filter_results, iter_chunks, results_page, score_chunk
+from explanation_policy import DEFERRED, ON_DEMAND, explain_on_demand, policy as explanation_policy
+from history_store import HistoryStore
 import json
 import pandas as pd
 from streamlit.components.v1 import html
 
+# Page sizes of the batch results grid
+RESULT_PAGE_SIZES = [25, 50, 100, 250]
+
 # --- Page Config (MUST BE FIRST) ---
 st.set_page_config(
     page_title="FraudShield AI",  # Updated name
@@ -41,8 +48,15 @@ metadata.setdefault("top_features", {
     }
 })
 
-# Initialize FraudDetector
-detector = FraudDetector()
+# Shared model registry, loaded once per process rather than on every rerun; it
+# watches models/ and swaps in new versions, so each rerun takes the current one
+@st.cache_resource
+def load_registry():
+    registry = get_registry()
+    registry.start()
+    return registry
+
+detector = load_registry().current
 
 # Custom CSS for fintech styling
 st.markdown("""
@@ -148,6 +162,136 @@ def confetti():
     </script>
     """)
 
+# Streaming batch analysis: score in chunks, explain on demand
+def render_batch_summary(summary):
+    st.table(summary.to_frame())
+    if summary.flagged.empty:
+        st.info("No fraud or borderline transactions found.")
+        return
+
+    columns = ["confidence", "fraud", "is_borderline", "patterns"]
+    if "Amount" in summary.flagged:
+        columns.insert(0, "Amount")
+    if "drivers" in summary.flagged:
+        columns.append("drivers")
+    st.markdown(f"**Flagged transactions** (top {summary.max_flagged} by confidence)")
+    st.dataframe(summary.flagged[columns], use_container_width=True)
+
+
+def render_streaming_batch(uploaded_file):
+    key = f"batch_summary_{uploaded_file.name}_{uploaded_file.size}"
+
+    if key not in st.session_state:
+        summary = BatchSummary()
+        live = st.empty()
+        try:
+            uploaded_file.seek(0)
+            for chunk in iter_chunks(uploaded_file):
+                summary.update(chunk, score_chunk(detector, chunk))
+                with live.container():
+                    st.markdown(f"Scored **{summary.rows:,}** transactions...")
+                    render_batch_summary(summary)
+        except Exception as e:
+            st.error(f"Error processing CSV file: {e}")
+            return
+        live.empty()
+
+        st.session_state[key] = summary
+        st.session_state.history.add_hourly(summary.hourly_rows, summary.hourly_fraud,
+                                            summary.hourly_amount, summary.hourly_fraud_amount)
+
+    summary = st.session_state[key]
+    st.success(f"Processed {summary.rows:,} transactions!")
+    render_batch_summary(summary)
+
+    if summary.flagged.empty:
+        return
+
+    # AI explanations are only generated for the row the user asks about
+    row = st.selectbox(
+        "Explain a flagged transaction",
+        summary.flagged.index,
+        format_func=lambda i: f"Row {i} ({summary.flagged.loc[i, 'confidence']*100:.1f}%)"
+    )
+    if st.button("Generate AI Explanation"):
+        with st.spinner('Generating explanation...'):
+            explanation = explain_on_demand(summary.transaction(row))
+        st.markdown(f"**Pattern Analysis**: {explanation}")
+
+# Batch results: one paginated grid, details only for the selected row
+def results_frame(results):
+    frame = pd.DataFrame({
+        "id": [result["transaction"].get("id") for result in results],
+        "Amount": [result["transaction"].get("Amount") for result in results],
+        "confidence": [result["fraud_result"]["confidence"] for result in results],
+        "fraud": [bool(result["fraud_result"]["fraud"]) for result in results],
+        "is_borderline": [bool(result["fraud_result"].get("is_borderline", False)) for result in results],
+        "patterns": [len(result.get("patterns") or []) for result in results],
+        "drivers": [format_drivers(result["fraud_result"].get("drivers") or []) or None for result in results],
+        "explanation": [result.get("explanation_tier") for result in results],
+    })
+    return frame.dropna(axis=1, how="all")
+
+
+def render_results_grid(frame, key):
+    """
+    Filter, sort and page `frame` server-side; only the current page is sent
+    to the browser. Returns the selected row label, or None.
+    """
+    cols = st.columns([2, 3, 2, 1])
+    view = cols[0].radio("Show", RESULT_VIEWS, horizontal=True, key=f"{key}_view")
+    confidence_range = cols[1].slider("Confidence", 0.0, 1.0, (0.0, 1.0), 0.01, key=f"{key}_confidence")
+    sort_by = cols[2].selectbox("Sort by", [c for c in ("confidence", "Amount", "patterns") if c in frame]
+                                + ["row"], key=f"{key}_sort")
+    descending = cols[3].toggle("Descending", value=sort_by != "row", key=f"{key}_descending")
+
+    rows = filter_results(frame, view, confidence_range)
+
+    cols = st.columns([1, 1, 4])
+    page_size = cols[0].selectbox("Rows per page", RESULT_PAGE_SIZES, key=f"{key}_page_size")
+    pages = max(1, -(-len(rows) // page_size))
+    # A narrower filter can leave the remembered page out of range
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages
+    page = cols[1].number_input("Page", min_value=1, max_value=pages, step=1, key=f"{key}_page")
+    cols[2].caption(f"{len(rows):,} of {len(frame):,} transactions, page {page} of {pages}")
+
+    shown = results_page(rows, page, page_size, None if sort_by == "row" else sort_by, descending)
+    st.dataframe(shown, use_container_width=True)
+    if shown.empty:
+        return None
+    return st.selectbox(
+        "Transaction details",
+        shown.index,
+        format_func=lambda i: f"Row {i} ({frame.loc[i, 'confidence']*100:.1f}%)",
+        key=f"{key}_row"
+    )
+
+
+def render_result_details(result, key):
+    col1, col2 = st.columns([1,2])
+    with col1:
+        st.markdown(f"""
+        <div class="fintech-card">
+            <div style="font-size: 1.5rem">{result['fraud_result']['confidence']*100:.1f}%</div>
+            <div class="pulse" style="color: {'#ef4444' if result['fraud_result']['fraud'] else '#10b981'}">
+                {'🚨 High Risk' if result['fraud_result']['fraud'] else '✅ Verified'}
+            </div>
+        </div>
+        """, unsafe_allow_html=True)
+    with col2:
+        st.markdown(f"**Pattern Analysis**: {result['explanation']}")
+        # Non-borderline, non-confident rows get the LLM only when asked
+        if result.get("explanation_tier") == DEFERRED and st.button(
+                "Generate AI Explanation", key=f"explain_{key}"):
+            with st.spinner('Generating explanation...'):
+                explanation = explain_on_demand(
+                    result["transaction"], result["fraud_result"], result["patterns"])
+            st.markdown(f"**AI Explanation**: {explanation}")
+
+        # Transaction details table
+        st.table(pd.DataFrame.from_dict(result['transaction'], orient='index', columns=['Value']))
+
 # Main App
 def main():
     # Navigation
@@ -169,13 +313,9 @@ def main():
             </script>
             """, unsafe_allow_html=True)
 
-    # Initialize session state for fraud pattern data
-    if "fraud_pattern_data" not in st.session_state:
-        st.session_state.fraud_pattern_data = pd.DataFrame({
-            "hour": [],
-            "fraud_attempts": [],
-            "amount": []
-        })
+    # Bounded history of analysed transactions with running hourly totals
+    if "history" not in st.session_state:
+        st.session_state.history = HistoryStore()
 
     # Analysis Section
     st.markdown('<div id="analyze"></div>', unsafe_allow_html=True)
@@ -186,58 +326,47 @@ def main():
 
         if input_method == "Batch Analysis":
             uploaded_file = st.file_uploader("Drag and drop CSV file or click to browse", 
-                                            type=["csv"],
-                                            help="Supported format: CSV with transaction details")
-
-            if uploaded_file:
-                try:
-                    with st.spinner('Analyzing transactions...'):
-                        df = pd.read_csv(uploaded_file)
-                        progress_bar = st.progress(0)
-                        results = []
-
-                        for index, row in df.iterrows():
-                            transaction = row.to_dict()
-                            workflow_state = fraud_workflow.invoke({"transaction": transaction})
-                            results.append(workflow_state)
-                            progress_bar.progress((index + 1) / len(df))
-
-                        st.success(f"Processed {len(df)} transactions!")
-
-                        # Simulate time distribution (if no timestamp is available)
-                        hours = list(range(24))  # Distribute transactions across 24 hours
-                        fraud_attempts = [result["fraud_result"]["fraud"] for result in results]
-                        amounts = [result["transaction"].get("Amount", 0) for result in results]
-                        simulated_hours = [hours[i % 24] for i in range(len(fraud_attempts))]  # Distribute across hours
-
-                        # Update fraud pattern data
-                        new_data = pd.DataFrame({
-                            "hour": simulated_hours,
-                            "fraud_attempts": fraud_attempts,
-                            "amount": amounts
-                        })
-                        st.session_state.fraud_pattern_data = pd.concat([st.session_state.fraud_pattern_data, new_data])
-
-                        # Display results
-                        for idx, result in enumerate(results, start=1):
-                            with st.expander(f"Transaction {result['transaction'].get('id', f'#{idx}')}", expanded=False):
-                                col1, col2 = st.columns([1,2])
-                                with col1:
-                                    st.markdown(f"""
-                                    <div class="fintech-card">
-                                        <div style="font-size: 1.5rem">{result['fraud_result']['confidence']*100:.1f}%</div>
-                                        <div class="pulse" style="color: {'#ef4444' if result['fraud_result']['fraud'] else '#10b981'}">
-                                            {'🚨 High Risk' if result['fraud_result']['fraud'] else '✅ Verified'}
-                                        </div>
-                                    </div>
-                                    """, unsafe_allow_html=True)
-                                with col2:
-                                    st.markdown(f"**Pattern Analysis**: {result['explanation']}")
-
-                                    # Transaction details table
-                                    st.table(pd.DataFrame.from_dict(result['transaction'], orient='index', columns=['Value']))
-                except Exception as e:
-                    st.error(f"Error processing CSV file: {e}")
+                                            type=["csv", "parquet", "arrow", "feather"],
+                                            help="Supported formats: CSV with transaction details; Parquet and Arrow in streaming mode")
+            streaming = st.checkbox("Streaming mode", value=True,
+                                    help="Score the file in chunks and generate AI explanations on demand")
+
+            if uploaded_file and streaming:
+                render_streaming_batch(uploaded_file)
+            elif uploaded_file:
+                key = f"batch_results_{uploaded_file.name}_{uploaded_file.size}"
+                if key not in st.session_state:
+                    try:
+                        with st.spinner('Analyzing transactions...'):
+                            uploaded_file.seek(0)
+                            df = pd.read_csv(uploaded_file)
+                            progress_bar = st.progress(0)
+                            results = []
+
+                            for index, row in df.iterrows():
+                                transaction = row.to_dict()
+                                workflow_state = workflow.get_fraud_workflow().invoke({"transaction": transaction})
+                                results.append(workflow_state)
+                                progress_bar.progress((index + 1) / len(df))
+
+                            # Simulate time distribution (if no timestamp is available): row number modulo 24
+                            st.session_state.history.extend(
+                                [i % 24 for i in range(len(results))],
+                                [result["fraud_result"]["fraud"] for result in results],
+                                [result["transaction"].get("Amount", 0) for result in results],
+                                [result["fraud_result"]["confidence"] for result in results]
+                            )
+                            # Kept so paging, sorting and filtering don't rerun the workflow
+                            st.session_state[key] = (results, results_frame(results))
+                    except Exception as e:
+                        st.error(f"Error processing CSV file: {e}")
+
+                if key in st.session_state:
+                    results, frame = st.session_state[key]
+                    st.success(f"Processed {len(results)} transactions!")
+                    row = render_results_grid(frame, key)
+                    if row is not None:
+                        render_result_details(results[row], key=f"{key}_{row}")
 
         else:
             transaction = {}
@@ -253,54 +382,78 @@ def main():
 
             if st.button("Analyze Transaction", type="primary"):
                 with st.spinner('Detecting anomalies...'):
-                    workflow_state = fraud_workflow.invoke({"transaction": transaction})
-
-                    # Update fraud pattern data
-                    current_hour = pd.Timestamp.now().hour
-                    new_data = pd.DataFrame({
-                        "hour": [current_hour],
-                        "fraud_attempts": [workflow_state["fraud_result"]["fraud"]],
-                        "amount": [workflow_state["transaction"].get("Amount", 0)]
-                    })
-                    st.session_state.fraud_pattern_data = pd.concat([st.session_state.fraud_pattern_data, new_data])
-
-                    col1, col2 = st.columns([1,2])
-                    with col1:
-                        st.markdown(f"""
-                        <div class="fintech-card">
-                            <div style="font-size: 2rem; margin-bottom: 1rem">
-                                {workflow_state['fraud_result']['confidence']*100:.1f}%
-                            </div>
-                            <div class="risk-badge" style="background: {
-                                '#ef444422' if workflow_state['fraud_result']['fraud'] else '#10b98122'
-                            }; color: {
-                                '#ef4444' if workflow_state['fraud_result']['fraud'] else '#10b981'
-                            }">
-                                {'High Risk' if workflow_state['fraud_result']['fraud'] else 'Low Risk'}
-                            </div>
+                    workflow_state = workflow.get_fraud_workflow().invoke({"transaction": transaction})
+                    st.session_state.last_analysis = workflow_state
+
+                    st.session_state.history.append(
+                        pd.Timestamp.now().hour,
+                        workflow_state["fraud_result"]["fraud"],
+                        workflow_state["transaction"].get("Amount", 0),
+                        workflow_state["fraud_result"]["confidence"]
+                    )
+
+                    if workflow_state["fraud_result"]["fraud"]:
+                        confetti()
+                        html("<script>fireConfetti()</script>")
+
+            # Kept in the session so the on-demand explanation button survives the rerun
+            workflow_state = st.session_state.get("last_analysis")
+            if workflow_state is not None:
+                col1, col2 = st.columns([1,2])
+                with col1:
+                    st.markdown(f"""
+                    <div class="fintech-card">
+                        <div style="font-size: 2rem; margin-bottom: 1rem">
+                            {workflow_state['fraud_result']['confidence']*100:.1f}%
                         </div>
-                        """, unsafe_allow_html=True)
-
-                        if workflow_state['fraud_result']['fraud']:
-                            confetti()
-                            html("<script>fireConfetti()</script>")
-
-                    with col2:
-                        st.markdown("### Transaction Details")
-                        cols = st.columns(3)
-                        for idx, (key, value) in enumerate(workflow_state['transaction'].items()):
-                            with cols[idx%3]:
-                                st.markdown(f"""
-                                <div class="fintech-card" style="padding: 1rem; margin-bottom: 1rem">
-                                    <div style="font-size: 0.8rem; opacity: 0.8">{key}</div>
-                                    <div style="font-size: 1.2rem">{value}</div>
-                                </div>
-                                """, unsafe_allow_html=True)
-
-                        st.markdown("### AI Explanation")
-                        st.markdown(workflow_state['explanation'])
-    # System Info
+                        <div class="risk-badge" style="background: {
+                            '#ef444422' if workflow_state['fraud_result']['fraud'] else '#10b98122'
+                        }; color: {
+                            '#ef4444' if workflow_state['fraud_result']['fraud'] else '#10b981'
+                        }">
+                            {'High Risk' if workflow_state['fraud_result']['fraud'] else 'Low Risk'}
+                        </div>
+                    </div>
+                    """, unsafe_allow_html=True)
+
+                with col2:
+                    st.markdown("### Transaction Details")
+                    cols = st.columns(3)
+                    for idx, (key, value) in enumerate(workflow_state['transaction'].items()):
+                        with cols[idx%3]:
+                            st.markdown(f"""
+                            <div class="fintech-card" style="padding: 1rem; margin-bottom: 1rem">
+                                <div style="font-size: 0.8rem; opacity: 0.8">{key}</div>
+                                <div style="font-size: 1.2rem">{value}</div>
+                            </div>
+                            """, unsafe_allow_html=True)
+
+                    st.markdown("### AI Explanation")
+                    explanation = st.empty()
+                    explanation.markdown(workflow_state['explanation'])
+                    if workflow_state.get("explanation_tier") == DEFERRED and st.button("Generate AI Explanation"):
+                        with st.spinner('Generating explanation...'):
+                            workflow_state["explanation"] = explain_on_demand(
+                                workflow_state["transaction"], workflow_state["fraud_result"], workflow_state["patterns"])
+                            workflow_state["explanation_tier"] = ON_DEMAND
+                        explanation.markdown(workflow_state['explanation'])
+    # History: read from the running hourly totals, never from raw rows
     st.markdown('<div id="history"></div>', unsafe_allow_html=True)
+    history = st.session_state.history
+    if history.total:
+        with st.container():
+            st.markdown("### Fraud Activity")
+            totals = history.totals()
+            cols = st.columns(4)
+            cols[0].metric("Transactions", f"{totals['transactions']:,}")
+            cols[1].metric("Fraud", f"{totals['fraud']:,}")
+            cols[2].metric("Fraud Rate", f"{totals['fraud_rate']*100:.2f}%")
+            cols[3].metric("Fraud Amount", f"{totals['fraud_amount']:,.2f}")
+            st.bar_chart(history.hourly_frame().set_index("hour")[["fraud_attempts"]])
+            with st.expander(f"Recent transactions (last {history.size:,})", expanded=False):
+                st.dataframe(history.recent(), use_container_width=True)
+
+    # System Info
     with st.container():
         st.markdown("### Model Insights")
         with st.expander("System Performance Metrics", expanded=False):
@@ -316,7 +469,7 @@ def main():
 
             with cols[1]:
                 st.markdown("**Model Metadata**")
-                st.metric("Model Version", metadata["model_version"],
+                st.metric("Model Version", detector.model_version,
                         help="Current version of the deployed fraud detection model.")
                 st.metric("Training Date", "9 March 2025",
                         help="Date when the model was last trained.")
@@ -340,6 +493,10 @@ def main():
                 </div>
                 """, unsafe_allow_html=True)
 
+            stats = explanation_policy.stats()
+            tiers = ", ".join(f"{tier}: {n:,}" for tier, n in stats["tiers"].items())
+            st.caption(f"Explanations ({stats['mode']}) - {tiers}; {stats['llm_calls_avoided']:,} LLM calls avoided")
+
     # Footer with Copyright and Social Links
     st.markdown("---")
     st.markdown("""
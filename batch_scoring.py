@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+from fraud_detector import format_drivers
+from streaming_io import iter_frames
+
+# Rows read from the upload and scored per step
+DEFAULT_CHUNK_SIZE = 5000
+
+# Fraud / borderline rows kept for display, highest confidence first
+MAX_FLAGGED_ROWS = 500
+
+
+def iter_chunks(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Read a CSV, Parquet or Arrow file in fixed-size chunks. The row index
+    keeps counting across chunks, so it is the row number within the file.
+    """
+    yield from iter_frames(source, chunk_size)
+
+
+def score_chunk(detector, chunk):
+    """
+    Score one chunk in bulk: probabilities, verdicts, the number of
+    matching fraud patterns and the model version per row. No LLM work
+    happens here.
+    """
+    scores = detector.predict_batch(chunk)
+    scores["patterns"] = detector.pattern_matcher.match_matrix(chunk).sum(axis=1)
+    scores["model_version"] = detector.model_version
+
+    # Feature contributions only for the rows that will be displayed
+    flagged = scores["fraud"] | scores["is_borderline"]
+    if detector.top_drivers and flagged.any():
+        values = detector.align_features(chunk[flagged]).to_numpy(dtype=np.float32)
+        _, drivers = detector.predict_with_drivers(values, detector.top_drivers)
+        scores.loc[flagged, "drivers"] = [format_drivers(row_drivers) for row_drivers in drivers]
+    return scores
+
+
+class BatchSummary:
+    """
+    Running totals over a streamed batch. Only the counters, 24 hourly bins
+    and the top flagged rows are kept, so memory does not grow with the file.
+    """
+
+    def __init__(self, max_flagged=MAX_FLAGGED_ROWS):
+        self.max_flagged = max_flagged
+        self.rows = 0
+        self.fraud = 0
+        self.borderline = 0
+        self.amount = 0.0
+        self.fraud_amount = 0.0
+        self.columns = []
+        self.hourly_rows = np.zeros(24, dtype=np.int64)
+        self.hourly_fraud = np.zeros(24, dtype=np.int64)
+        self.hourly_amount = np.zeros(24, dtype=np.float64)
+        self.hourly_fraud_amount = np.zeros(24, dtype=np.float64)
+        self.flagged = pd.DataFrame()
+
+    def update(self, chunk, scores):
+        if not self.columns:
+            self.columns = list(chunk.columns)
+
+        amounts = chunk["Amount"].fillna(0).to_numpy(dtype=np.float64) if "Amount" in chunk else np.zeros(len(chunk))
+        fraud = scores["fraud"].to_numpy()
+
+        self.rows += len(chunk)
+        self.fraud += int(fraud.sum())
+        self.borderline += int(scores["is_borderline"].sum())
+        self.amount += float(amounts.sum())
+        self.fraud_amount += float(amounts[fraud].sum())
+
+        # Simulated time distribution: row number modulo 24 (no timestamp in the data)
+        hours = chunk.index.to_numpy() % 24
+        self.hourly_rows += np.bincount(hours, minlength=24)
+        self.hourly_fraud += np.bincount(hours, weights=fraud, minlength=24).astype(np.int64)
+        self.hourly_amount += np.bincount(hours, weights=amounts, minlength=24)
+        self.hourly_fraud_amount += np.bincount(hours, weights=np.where(fraud, amounts, 0.0), minlength=24)
+
+        flagged = scores["fraud"] | scores["is_borderline"]
+        if flagged.any():
+            new_rows = pd.concat([chunk[flagged], scores[flagged]], axis=1)
+            self.flagged = pd.concat([self.flagged, new_rows]).nlargest(self.max_flagged, "confidence")
+
+    def to_frame(self):
+        return pd.DataFrame({
+            "Metric": ["Transactions", "Fraud", "Borderline", "Fraud rate", "Total amount", "Fraud amount"],
+            "Value": [
+                f"{self.rows:,}",
+                f"{self.fraud:,}",
+                f"{self.borderline:,}",
+                f"{(self.fraud / self.rows if self.rows else 0) * 100:.2f}%",
+                f"{self.amount:,.2f}",
+                f"{self.fraud_amount:,.2f}",
+            ]
+        })
+
+    def hourly_frame(self):
+        return pd.DataFrame({
+            "hour": np.arange(24),
+            "fraud_attempts": self.hourly_fraud,
+            "amount": self.hourly_amount
+        })
+
+    def transaction(self, row):
+        """
+        Original input values of a flagged row, for on-demand explanation.
+        """
+        return self.flagged.loc[row, self.columns].to_dict()
+
+
+# Views of the results grid
+RESULT_VIEWS = ("All", "Fraud", "Borderline")
+
+
+def filter_results(frame, view="All", confidence_range=(0.0, 1.0)):
+    """
+    Rows of a results frame in the given view and confidence range.
+    """
+    mask = frame["confidence"].between(*confidence_range)
+    if view == "Fraud":
+        mask &= frame["fraud"]
+    elif view == "Borderline":
+        mask &= frame["is_borderline"]
+    return frame[mask]
+
+
+def results_page(frame, page, page_size, sort_by="confidence", descending=True):
+    """
+    One page (counting from 1) of a results frame sorted by `sort_by`, or by
+    row number when it is None.
+    """
+    if sort_by is None:
+        ordered = frame.sort_index(ascending=not descending)
+    else:
+        ordered = frame.sort_values(sort_by, ascending=not descending, kind="stable")
+    start = (page - 1) * page_size
+    return ordered.iloc[start:start + page_size]
@@ -0,0 +1,37 @@
+"""
+Deterministic stand-in for ChatGroq with configurable latency.
+"""
+import asyncio
+import hashlib
+import time
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeChatModel:
+    """
+    Answers every prompt with a short digest of it after `latency` seconds.
+    Supports invoke and ainvoke like a LangChain chat model.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def _answer(self, prompt):
+        self.calls += 1
+        digest = hashlib.sha1(str(prompt).encode()).hexdigest()[:12]
+        return FakeResponse(f"Fake analysis {digest}")
+
+    def invoke(self, prompt):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._answer(prompt)
+
+    async def ainvoke(self, prompt):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._answer(prompt)
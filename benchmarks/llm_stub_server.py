@@ -0,0 +1,82 @@
+"""
+Local stand-in for the Groq chat completions API that enforces its own
+rate limit, answering 429 with Retry-After like the real service.
+
+Usage:
+    python benchmarks/llm_stub_server.py --port 9000 --rpm 60 --error-rate 0.05
+    python llm_scheduler.py --base-url http://127.0.0.1:9000 --requests 50
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+import uvicorn
+
+
+def build_app(rpm, latency, error_rate, seed=0):
+    app = FastAPI(title="LLM stub")
+    rng = random.Random(seed)
+    # Sliding one-minute window of accepted request times
+    accepted = []
+    app.state.stats = {"ok": 0, "rate_limited": 0, "errors": 0}
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        now = time.monotonic()
+        while accepted and accepted[0] <= now - 60:
+            accepted.pop(0)
+
+        if len(accepted) >= rpm:
+            app.state.stats["rate_limited"] += 1
+            retry_after = accepted[0] + 60 - now
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                status_code=429, headers={"retry-after": f"{retry_after:.2f}"}
+            )
+        if rng.random() < error_rate:
+            app.state.stats["errors"] += 1
+            return JSONResponse({"error": {"message": "Service unavailable", "type": "server_error"}},
+                                status_code=503)
+
+        accepted.append(now)
+        await asyncio.sleep(latency)
+        app.state.stats["ok"] += 1
+        prompt = body["messages"][-1]["content"]
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": f"Stub analysis of {len(prompt)} characters"},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 8, "total_tokens": len(prompt) // 4 + 8},
+        }
+
+    @app.get("/stats")
+    def stats():
+        return app.state.stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--rpm", type=int, default=30, help="Requests per minute before answering 429")
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    args = parser.parse_args()
+
+    uvicorn.run(build_app(args.rpm, args.latency_ms / 1000, args.error_rate), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Micro-benchmarks for the scoring hot paths, written as JSON so runs on
+different commits can be compared.
+
+Suites:
+    predict    FraudDetector.predict latency (p50/p95/p99) per transaction
+    batch      predict_batch throughput at several batch sizes
+    patterns   get_relevant_patterns cost as the number of rules grows
+    workflow   fraud_workflow.invoke with a fake LLM of fixed latency
+    load       model and detector load time
+
+Usage:
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --suites predict batch --llm-latency-ms 50
+    python benchmarks/run.py --compare before.json after.json
+"""
+import argparse
+import functools
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+import numpy as np
+
+import synthetic
+from fake_llm import FakeChatModel
+
+sys.path.insert(0, synthetic.ROOT)
+
+SUITES = ["predict", "batch", "patterns", "workflow", "load"]
+
+DEFAULT_BATCH_SIZES = [1, 10, 100, 1000, 10000, 100000]
+DEFAULT_RULE_COUNTS = [10, 100, 1000, 5000]
+
+# Bounds on predict_batch calls timed per batch size
+MIN_CALLS = 3
+MAX_CALLS = 1000
+
+# Relative slowdown of a comparable metric reported as a regression
+REGRESSION_THRESHOLD = 0.10
+
+# Requests and tokens per minute of the workflow suite's LLM scheduler (no rate limiting)
+UNLIMITED_RATE = 1e12
+
+
+def percentiles(timings):
+    """
+    Latency summary in milliseconds.
+    """
+    ms = np.asarray(timings) * 1000
+    return {
+        "n": int(ms.size),
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+    }
+
+
+def time_each(fn, items, repeat=1):
+    timings = []
+    for _ in range(repeat):
+        for item in items:
+            start = time.perf_counter()
+            fn(item)
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def sample_transactions(count, seed=0):
+    """
+    The demonstration rows followed by synthetic ones, `count` in total.
+    """
+    records = synthetic.demonstration_records()[:count]
+    if len(records) < count:
+        records += synthetic.transactions(count - len(records), seed=seed).to_dict("records")
+    return records
+
+
+def bench_predict(detector, args):
+    transactions = sample_transactions(args.transactions)
+    detector.predict(transactions[0])
+    return percentiles(time_each(detector.predict, transactions, args.repeat))
+
+
+def bench_batch(detector, args):
+    results = {}
+    for size in args.batch_sizes:
+        frame = synthetic.transactions(size, seed=size)
+        detector.predict_batch(frame)
+        # Roughly the same number of rows per size, within MIN_CALLS..MAX_CALLS calls
+        calls = min(MAX_CALLS, max(MIN_CALLS, max(args.batch_sizes) // size))
+        timings = time_each(detector.predict_batch, [frame] * calls)
+        best = min(timings)
+        results[str(size)] = {
+            **percentiles(timings),
+            "rows_per_s": round(size / best, 1),
+        }
+    return results
+
+
+def bench_patterns(detector, args):
+    from pattern_matcher import PatternMatcher
+
+    transactions = sample_transactions(args.transactions)
+    original = detector.pattern_matcher
+    results = {}
+    try:
+        for count in args.rule_counts:
+            detector.pattern_matcher = PatternMatcher(synthetic.patterns(count, seed=count))
+            detector.get_relevant_patterns(transactions[0])
+            results[str(count)] = percentiles(time_each(detector.get_relevant_patterns, transactions))
+        detector.pattern_matcher = original
+        results["shipped"] = {
+            "rules": len(original.records),
+            **percentiles(time_each(detector.get_relevant_patterns, transactions)),
+        }
+    finally:
+        detector.pattern_matcher = original
+    return results
+
+
+def bench_workflow(detector, args):
+    import llm_chain
+    import llm_scheduler
+    import workflow
+
+    fake = FakeChatModel(latency=args.llm_latency_ms / 1000)
+    original = workflow.process_transaction
+    # No explanation cache, so every invoke pays for one (fake) LLM call
+    workflow.process_transaction = functools.partial(llm_chain.process_transaction, model=fake, cache=None)
+    # The fake calls go through the scheduler like real ones, without the provider's rate limits
+    scheduler = llm_scheduler.LLMScheduler(requests_per_minute=UNLIMITED_RATE, tokens_per_minute=UNLIMITED_RATE)
+    previous_scheduler = llm_scheduler.set_scheduler(scheduler)
+    try:
+        graph = workflow.get_fraud_workflow()
+        transactions = sample_transactions(args.transactions)
+        graph.invoke({"transaction": transactions[0]})
+
+        fake.calls = 0
+        invoke = time_each(lambda t: graph.invoke({"transaction": t}), transactions, args.repeat)
+        llm_calls = fake.calls
+        fast = time_each(workflow.score_transaction, transactions, args.repeat)
+        predict = time_each(detector.predict, transactions, args.repeat)
+    finally:
+        workflow.process_transaction = original
+        llm_scheduler.set_scheduler(previous_scheduler)
+        scheduler.stop()
+
+    invoke_stats = percentiles(invoke)
+    llm_ms = args.llm_latency_ms * llm_calls / len(invoke)
+    return {
+        "llm_latency_ms": args.llm_latency_ms,
+        "llm_calls": llm_calls,
+        "invoke": invoke_stats,
+        "score_transaction": percentiles(fast),
+        "predict": percentiles(predict),
+        # Mean time the graph, prompt building and nodes add on top of the model and LLM
+        "overhead_mean_ms": round(invoke_stats["mean_ms"] - llm_ms - float(np.mean(predict)) * 1000, 4),
+    }
+
+
+def bench_load(detector, args):
+    import joblib
+    from fraud_detector import FraudDetector
+    from native_engine import NativeEngine, MODEL_PATH
+
+    feature_names = detector.metadata['feature_names']
+    results = {
+        "native_engine": percentiles(time_each(lambda _: NativeEngine(feature_names), range(args.load_repeat))),
+        "fraud_detector": percentiles(time_each(lambda _: FraudDetector(), range(args.load_repeat))),
+        "pickled_model": percentiles(time_each(lambda _: joblib.load(MODEL_PATH), range(args.load_repeat))),
+    }
+    # Cold start of a fresh interpreter, including imports
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "from fraud_detector import get_detector; get_detector()"],
+                   cwd=synthetic.ROOT, check=True, capture_output=True)
+    results["cold_process_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return results
+
+
+BENCHMARKS = {
+    "predict": bench_predict,
+    "batch": bench_batch,
+    "patterns": bench_patterns,
+    "workflow": bench_workflow,
+    "load": bench_load,
+}
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=synthetic.ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    import xgboost
+
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "xgboost": xgboost.__version__,
+    }
+
+
+def run(args):
+    from fraud_detector import get_detector
+
+    # The process-wide detector, which the workflow's nodes and fast path use too
+    detector = get_detector()
+    # The suites re-time the same rows, which the score cache would answer without the model
+    detector.cache = None
+    results = {"environment": environment(), "config": {
+        "transactions": args.transactions,
+        "repeat": args.repeat,
+        "batch_sizes": args.batch_sizes,
+        "rule_counts": args.rule_counts,
+        "llm_latency_ms": args.llm_latency_ms,
+    }, "results": {}}
+    for suite in args.suites:
+        start = time.perf_counter()
+        results["results"][suite] = BENCHMARKS[suite](detector, args)
+        print(f"{suite:<10} done in {time.perf_counter() - start:6.1f} s", file=sys.stderr)
+    return results
+
+
+def flatten(tree, prefix=""):
+    """
+    {"a": {"b": 1}} -> {"a.b": 1} for the numeric leaves.
+    """
+    flat = {}
+    for key, value in tree.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(before_path, after_path, threshold=REGRESSION_THRESHOLD):
+    """
+    Print the change of every shared metric; returns the regressed ones.
+    Times (*_ms) regress when they grow, rows_per_s when it shrinks.
+    """
+    with open(before_path) as f:
+        before = flatten(json.load(f)["results"])
+    with open(after_path) as f:
+        after = flatten(json.load(f)["results"])
+
+    regressions = []
+    for name in sorted(before.keys() & after.keys()):
+        if not (name.endswith("_ms") or name.endswith("rows_per_s")) or not before[name]:
+            continue
+        change = after[name] / before[name] - 1
+        worse = -change if name.endswith("rows_per_s") else change
+        flag = "REGRESSION" if worse > threshold else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<48} {before[name]:>12.4f} -> {after[name]:>12.4f}  {change:+7.1%}  {flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=SUITES)
+    parser.add_argument("--output", help="Write results JSON here (default: stdout)")
+    parser.add_argument("--transactions", type=int, default=500, help="Transactions per latency benchmark")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=DEFAULT_BATCH_SIZES)
+    parser.add_argument("--rule-counts", type=int, nargs="+", default=DEFAULT_RULE_COUNTS)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Latency of the fake LLM")
+    parser.add_argument("--load-repeat", type=int, default=3)
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="Compare two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, threshold=args.threshold) else 0)
+
+    # Model and pattern paths are relative to the repository root
+    os.chdir(synthetic.ROOT)
+    import fraud_detector  # configures logging on import; quieten it afterwards
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(results + "\n")
+    else:
+        print(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Throughput and memory of the pre-forked API (gunicorn.conf.py) as the
+number of workers grows.
+
+For each worker count the server is started, /ready is polled until every
+worker is warm, and client processes post /score over keep-alive
+connections for a fixed time. Memory is read from /proc/<pid>/smaps_rollup
+(Linux) after the load: RSS counts shared pages once per process, PSS splits
+them between the processes sharing them, so the sum of PSS is the real
+footprint and the gap between the two is what pre-forking saves. The score
+cache is disabled so every request reaches the model.
+
+Usage:
+    python benchmarks/serving.py --workers 1 2 4 --duration 10 --output serving.json
+    python benchmarks/serving.py --workers 4 --no-preload   # each worker loads its own model
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import synthetic
+from run import environment, percentiles
+
+DEFAULT_WORKERS = [1, 2, 4]
+
+# Seconds to wait for /ready after starting the server
+READY_TIMEOUT = 120
+
+# Transactions the clients cycle through
+SAMPLE_SIZE = 1000
+
+
+def request(port, method, path, body=None, timeout=5):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        connection.request(method, path, body=body, headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def wait_ready(port, server, timeout=READY_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            if request(port, "GET", "/ready")[0] == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"Server not ready after {timeout}s")
+
+
+def children(pid):
+    """
+    Pids of the direct children of `pid`, from /proc.
+    """
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; fields resume after ")"
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            pids.append(int(entry))
+    return sorted(pids)
+
+
+def memory(pid):
+    """
+    RSS, PSS, shared and private memory of a process in MB.
+    """
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss_mb": round(values.get("Rss", 0.0), 1),
+        "pss_mb": round(values.get("Pss", 0.0), 1),
+        "shared_mb": round(values.get("Shared_Clean", 0.0) + values.get("Shared_Dirty", 0.0), 1),
+        "private_mb": round(values.get("Private_Clean", 0.0) + values.get("Private_Dirty", 0.0), 1),
+    }
+
+
+def client(args):
+    """
+    Post /score in a loop until `duration` is up; returns the latencies
+    and the number of failed requests.
+    """
+    port, bodies, duration, offset = args
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    headers = {"Content-Type": "application/json"}
+    timings, errors = [], 0
+    deadline = time.perf_counter() + duration
+    i = offset
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        # A recycled worker closes idle keep-alive connections; like HTTP
+        # client libraries, retry once on a fresh connection
+        for attempt in range(2):
+            try:
+                connection.request("POST", "/score", body=bodies[i % len(bodies)], headers=headers)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+                if attempt:
+                    errors += 1
+                continue
+            if response.status == 200:
+                timings.append(time.perf_counter() - start)
+            else:
+                errors += 1
+            break
+        i += 1
+    connection.close()
+    return timings, errors
+
+
+def bench_workers(workers, args, bodies):
+    env = {
+        **os.environ,
+        "WEB_CONCURRENCY": str(workers),
+        "BIND": f"127.0.0.1:{args.port}",
+        "PRELOAD_APP": "0" if args.no_preload else "1",
+        "SCORE_CACHE_SIZE": "0",
+        # Recycling would restart workers in the middle of a run
+        "MAX_REQUESTS": "0",
+    }
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "Api:app"],
+                              cwd=synthetic.ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(args.port, server)
+        # /ready passes as soon as one worker is warm; wait for the others too
+        while len(children(server.pid)) < workers:
+            time.sleep(0.2)
+        time.sleep(1.0)
+        ready_s = time.perf_counter() - start
+
+        clients = args.clients or 2 * workers
+        with multiprocessing.Pool(clients) as pool:
+            results = pool.map(client, [(args.port, bodies, args.duration, k * 97) for k in range(clients)])
+        timings = [t for result in results for t in result[0]]
+        errors = sum(result[1] for result in results)
+
+        master = memory(server.pid)
+        per_worker = [memory(pid) for pid in children(server.pid)]
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+    return {
+        "workers": workers,
+        "clients": clients,
+        "ready_s": round(ready_s, 2),
+        "requests_per_s": round(len(timings) / args.duration, 1),
+        "errors": errors,
+        "latency": percentiles(timings) if timings else None,
+        "master": master,
+        "per_worker": per_worker,
+        "total_rss_mb": round(master["rss_mb"] + sum(w["rss_mb"] for w in per_worker), 1),
+        "total_pss_mb": round(master["pss_mb"] + sum(w["pss_mb"] for w in per_worker), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=DEFAULT_WORKERS)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of load per worker count")
+    parser.add_argument("--clients", type=int, help="Client processes (default: two per worker)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--no-preload", action="store_true", help="Load the model in each worker instead")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    bodies = [json.dumps(record) for record in synthetic.transactions(SAMPLE_SIZE).to_dict("records")]
+
+    runs = []
+    for workers in args.workers:
+        result = bench_workers(workers, args, bodies)
+        runs.append(result)
+        print(f"{workers} workers: {result['requests_per_s']} req/s, "
+              f"RSS {result['total_rss_mb']} MB, PSS {result['total_pss_mb']} MB", file=sys.stderr)
+
+    baseline = runs[0]["requests_per_s"] / runs[0]["workers"] if runs[0]["requests_per_s"] else None
+    for result in runs:
+        result["scaling_efficiency"] = (round(result["requests_per_s"] / (baseline * result["workers"]), 3)
+                                        if baseline else None)
+
+    report = {"environment": environment(), "preload": not args.no_preload, "runs": runs}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
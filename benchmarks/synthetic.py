@@ -0,0 +1,65 @@
+"""
+Synthetic transactions and fraud patterns shaped like the real data.
+"""
+import glob
+import os
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FEATURE_NAMES = [f"V{i}" for i in range(1, 29)] + ["Amount"]
+
+# Features the fraud-like rows are pushed on (the model's top features)
+FRAUD_SHIFTS = {"V10": -8.0, "V14": -10.0, "V4": 5.0, "V12": -6.0, "V17": -12.0}
+
+OPERATORS = ["<", "<=", ">", ">="]
+
+
+def transactions(rows, fraud_rate=0.01, seed=0):
+    """
+    DataFrame with the 29-feature schema: PCA-like V-features around 0 and
+    a long-tailed Amount, with `fraud_rate` of rows shifted towards fraud.
+    """
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame(rng.normal(scale=1.5, size=(rows, 28)), columns=FEATURE_NAMES[:-1])
+    frame["Amount"] = rng.lognormal(mean=3.5, sigma=1.2, size=rows).round(2)
+
+    fraud = rng.random(rows) < fraud_rate
+    for feature, shift in FRAUD_SHIFTS.items():
+        frame.loc[fraud, feature] += shift
+    return frame
+
+
+def patterns(count, seed=0):
+    """
+    Pattern table in the aligned_fraud_patterns.csv format with `count`
+    random threshold rules, a tenth of them ranges.
+    """
+    rng = np.random.default_rng(seed)
+    features = rng.choice(FEATURE_NAMES[:-1], size=count)
+    thresholds = rng.normal(scale=4.0, size=count).round(1)
+    operators = rng.choice(OPERATORS, size=count)
+
+    conditions = [
+        f"{t - 2.0} < Value < {t + 2.0}" if i % 10 == 0 else f"Value {op} {t}"
+        for i, (op, t) in enumerate(zip(operators, thresholds))
+    ]
+    return pd.DataFrame({
+        "feature": features,
+        "condition": conditions,
+        "risk_level": "Medium",
+        "description": [f"Synthetic rule {i}" for i in range(count)],
+        "fraud_type": "synthetic",
+    })
+
+
+def demonstration_records():
+    """
+    Rows of every Demonstration/*.csv as dicts, without empty cells.
+    """
+    records = []
+    for path in sorted(glob.glob(os.path.join(ROOT, "Demonstration", "*.csv"))):
+        for record in pd.read_csv(path).to_dict("records"):
+            records.append({k: v for k, v in record.items() if pd.notna(v)})
+    return records
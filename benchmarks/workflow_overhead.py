@@ -0,0 +1,63 @@
+"""
+Per-transaction overhead of the fraud workflow, with the LLM call stubbed out.
+
+Usage:
+    python benchmarks/workflow_overhead.py [--csv Demonstration/100data.csv] [--repeat 5]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import workflow
+
+
+def stub_process_transaction(transaction, fraud_result, patterns, is_borderline=False, **kwargs):
+    return "stub explanation"
+
+
+def time_per_call(fn, transactions, repeat):
+    timings = []
+    for _ in range(repeat):
+        for transaction in transactions:
+            start = time.perf_counter()
+            fn(transaction)
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{name:<28} mean {statistics.mean(timings) * 1e3:8.3f} ms   "
+          f"p50 {statistics.median(timings) * 1e3:8.3f} ms   p95 {p95 * 1e3:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="Demonstration/100data.csv")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    workflow.process_transaction = stub_process_transaction
+    # Repeated rows would otherwise be answered by the score cache, not the model
+    workflow.detector.cache = None
+    transactions = [row.to_dict() for _, row in pd.read_csv(args.csv).iterrows()]
+
+    # Warm up model and graph
+    workflow.fraud_workflow.invoke({"transaction": transactions[0]})
+
+    report("fraud_workflow.invoke", time_per_call(
+        lambda t: workflow.fraud_workflow.invoke({"transaction": t}), transactions, args.repeat))
+    report("detector.predict", time_per_call(workflow.detector.predict, transactions, args.repeat))
+    if hasattr(workflow, "score_transaction"):
+        report("score_transaction (fast)", time_per_call(workflow.score_transaction, transactions, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Pre-filter cascade: a linear model on the top features that clears
+obviously legitimate transactions before the full XGBoost model.
+
+The filter is a least-squares fit of the full model's log-odds on a few
+top-importance features (V10 and V14 carry most of it). Its clearing cutoff
+is calibrated offline so that at least `recall` of the positive rows still
+reach the full model. Positives are rows the full model would not clear
+(probability in or above the borderline band), plus labelled frauds when
+the CSV has a label column. Cleared rows are reported with the filter's
+estimate, which always stays below the borderline band.
+
+The calibration only holds for the booster it was fitted against, whose
+digest is saved with the filter. FraudDetector leaves a filter fitted for
+another booster disabled, and a hot reload that would pair them is rejected;
+refit after replacing the model.
+
+Usage:
+    python cascade.py fit train.csv --recall 0.999 [--label Class]
+    python cascade.py evaluate test.csv [--label Class]
+"""
+import argparse
+import json
+import logging
+import os
+import time
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CASCADE_PATH = "models/cascade.json"
+
+# Loaded by FraudDetector when the file exists, unless CASCADE=0
+ENABLED = os.getenv("CASCADE", "1") != "0"
+
+# Share of positive rows that must reach the full model
+DEFAULT_RECALL = 0.999
+
+# Top-importance features the filter looks at
+DEFAULT_FEATURES = 4
+
+# Probabilities are clipped to this before taking log-odds
+EPSILON = 1e-6
+
+
+def logit(p):
+    p = np.clip(np.asarray(p, dtype=np.float64), EPSILON, 1 - EPSILON)
+    return np.log(p / (1 - p))
+
+
+def top_features(metadata, n=DEFAULT_FEATURES):
+    importance = metadata["top_features"]["Importance"]
+    ranked = sorted(importance, key=lambda rank: -importance[rank])
+    return [metadata["top_features"]["Feature"][rank] for rank in ranked[:n]]
+
+
+class CascadeFilter:
+    def __init__(self, feature_names, features, weights, bias, cutoff, recall=DEFAULT_RECALL, **info):
+        self.features = list(features)
+        self.columns = np.array([list(feature_names).index(f) for f in self.features], dtype=np.intp)
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.cutoff = float(cutoff)
+        self.recall = recall
+        self.info = info
+
+    @property
+    def model_digest(self):
+        """
+        Digest of the booster the filter was calibrated against (None for
+        filters saved before it was recorded).
+        """
+        return self.info.get("model_digest")
+
+    @classmethod
+    def load(cls, feature_names, path=CASCADE_PATH):
+        with open(path, "r") as f:
+            return cls(feature_names, **json.load(f))
+
+    def save(self, path=CASCADE_PATH):
+        data = {
+            "features": self.features,
+            "weights": self.weights.tolist(),
+            "bias": self.bias,
+            "cutoff": self.cutoff,
+            "recall": self.recall,
+            **self.info,
+        }
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+
+    def log_odds(self, values):
+        """
+        Estimated full-model log-odds for rows ordered like feature_names.
+        """
+        return values[:, self.columns] @ self.weights + self.bias
+
+    def contributions(self, values):
+        """
+        Each filter feature's term of the log-odds, one column per feature.
+        """
+        return values[:, self.columns] * self.weights
+
+    def screen(self, values):
+        """
+        (probabilities, cleared) for a 2-D float32 array: the filter's
+        estimate for every row, and which rows it clears.
+        """
+        scores = self.log_odds(values)
+        cleared = scores < self.cutoff
+        return 1.0 / (1.0 + np.exp(-scores.astype(np.float64))), cleared
+
+
+def fit(detector, frame, label=None, recall=DEFAULT_RECALL, n_features=DEFAULT_FEATURES):
+    """
+    Fit and calibrate a CascadeFilter on a DataFrame of transactions.
+    """
+    from fraud_detector import BORDERLINE_LOW
+
+    feature_names = detector.metadata["feature_names"]
+    values = detector.align_features(frame).to_numpy(dtype=np.float32)
+    probs = detector.engine.predict_proba(values)
+
+    features = top_features(detector.metadata, n_features)
+    columns = [feature_names.index(f) for f in features]
+    design = np.column_stack([values[:, columns], np.ones(len(values), dtype=np.float32)])
+    solution = np.linalg.lstsq(design.astype(np.float64), logit(probs), rcond=None)[0]
+    weights, bias = solution[:-1], solution[-1]
+
+    positive = probs >= BORDERLINE_LOW
+    if label is not None:
+        positive |= frame[label].to_numpy().astype(bool)
+    scores = values[:, columns] @ weights + bias
+
+    # Never clear a row the filter itself places in the borderline band
+    cutoff = float(logit(BORDERLINE_LOW))
+    if positive.any():
+        # The lowest scores among positives are the ones the filter may miss
+        misses = int(np.floor((1 - recall) * positive.sum()))
+        cutoff = min(cutoff, float(np.sort(scores[positive])[misses]))
+
+    return CascadeFilter(
+        feature_names, features, weights, bias, cutoff, recall,
+        rows=len(values), positives=int(positive.sum()),
+        model_digest=detector.engine.model_digest
+    )
+
+
+def evaluate(detector, cascade, frame, label=None):
+    """
+    Share of rows the cascade clears, and what that costs in recall and
+    verdict changes against the full model alone.
+    """
+    from fraud_detector import BORDERLINE_LOW
+
+    values = detector.align_features(frame).to_numpy(dtype=np.float32)
+
+    start = time.perf_counter()
+    full = detector.engine.predict_proba(values)
+    full_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    probs, cleared = cascade.screen(values)
+    if (~cleared).any():
+        probs[~cleared] = detector.engine.predict_proba(values[~cleared])
+    cascade_time = time.perf_counter() - start
+
+    full_verdicts = detector.verdicts(full)
+    cascade_verdicts = detector.verdicts(probs)
+    flagged = full >= BORDERLINE_LOW
+    report = {
+        "rows": len(values),
+        "cleared": int(cleared.sum()),
+        "cleared_fraction": float(cleared.mean()) if len(values) else 0.0,
+        # Rows the full model would not clear that the cascade cleared anyway
+        "flagged_missed": int((flagged & cleared).sum()),
+        "flagged_recall": float(1 - (flagged & cleared).sum() / flagged.sum()) if flagged.any() else 1.0,
+        "verdict_changes": int((full_verdicts["fraud"] != cascade_verdicts["fraud"]).sum()),
+        "full_model_ms": full_time * 1000,
+        "cascade_ms": cascade_time * 1000,
+    }
+
+    if label is not None:
+        truth = frame[label].to_numpy().astype(bool)
+        frauds = max(int(truth.sum()), 1)
+        report["recall_full"] = float((full_verdicts["fraud"] & truth).sum() / frauds)
+        report["recall_cascade"] = float((cascade_verdicts["fraud"] & truth).sum() / frauds)
+        report["recall_loss"] = report["recall_full"] - report["recall_cascade"]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["fit", "evaluate"])
+    parser.add_argument("csv", help="Transactions to fit on or evaluate against")
+    parser.add_argument("--label", help="Column holding the true fraud label (e.g. Class)")
+    parser.add_argument("--recall", type=float, default=DEFAULT_RECALL)
+    parser.add_argument("--features", type=int, default=DEFAULT_FEATURES)
+    parser.add_argument("--path", default=CASCADE_PATH)
+    args = parser.parse_args()
+
+    from fraud_detector import FraudDetector
+
+    detector = FraudDetector()
+    frame = pd.read_csv(args.csv)
+    if args.command == "fit":
+        cascade = fit(detector, frame, args.label, args.recall, args.features)
+        cascade.save(args.path)
+        logger.info(f"Cascade on {cascade.features} saved to {args.path}")
+    else:
+        cascade = CascadeFilter.load(detector.metadata["feature_names"], args.path)
+    print(json.dumps(evaluate(detector, cascade, frame, args.label), indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
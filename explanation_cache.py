@@ -0,0 +1,191 @@
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import math
+import numbers
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Defaults for the LLM explanation cache
+DEFAULT_CACHE_PATH = "data/explanation_cache.sqlite"
+DEFAULT_MEMORY_ENTRIES = 1024
+DEFAULT_DISK_ENTRIES = 100000
+DEFAULT_TTL = 7 * 24 * 3600  # seconds
+DEFAULT_PRECISION = 2  # decimals kept when quantizing feature values
+
+# Share of max_disk_entries evicted at once when the SQLite tier is full, so
+# eviction runs once per that many new entries rather than on every set
+EVICT_FRACTION = 0.1
+
+# Transaction fields that never influence the explanation key
+IGNORED_KEYS = ("id",)
+
+
+def quantize(value, precision=DEFAULT_PRECISION):
+    if isinstance(value, bool) or not isinstance(value, numbers.Real):
+        return value
+    if math.isnan(value):
+        return None
+    return round(float(value), precision)
+
+
+def make_key(template, transaction, fraud_result, patterns, precision=DEFAULT_PRECISION):
+    """
+    Cache key for an explanation: prompt template, model version, quantized
+    transaction, model verdict and the set of matched patterns.
+    """
+    payload = {
+        "template": template,
+        # Explanations of a model that has since been reloaded are not reused
+        "model_version": fraud_result.get("model_version") if isinstance(fraud_result, dict) else None,
+        "transaction": sorted(
+            (str(k), quantize(v, precision))
+            for k, v in transaction.items()
+            if k not in IGNORED_KEYS
+        ),
+        "verdict": [
+            bool(fraud_result.get("fraud")) if isinstance(fraud_result, dict) else None,
+            bool(fraud_result.get("is_borderline")) if isinstance(fraud_result, dict) else None,
+        ],
+        "patterns": sorted((p["feature"], p["condition"]) for p in patterns),
+    }
+    return hashlib.sha256(json.dumps(payload, default=str).encode()).hexdigest()
+
+
+class ExplanationCache:
+    """
+    Two-tier cache for LLM explanations: an in-memory LRU in front of a SQLite
+    table. Both tiers expire entries after `ttl` seconds; when the SQLite tier
+    grows beyond `max_disk_entries`, its expired and least recently used rows
+    are evicted. Pass path=None for a memory-only cache.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_memory_entries=DEFAULT_MEMORY_ENTRIES,
+                 max_disk_entries=DEFAULT_DISK_ENTRIES, ttl=DEFAULT_TTL, precision=DEFAULT_PRECISION):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self.precision = precision
+
+        self.memory = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._connection = None
+        # Rows in the SQLite table, counted once when it is opened
+        self._disk_entries = 0
+
+    def key(self, template, transaction, fraud_result, patterns):
+        return make_key(template, transaction, fraud_result, patterns, self.precision)
+
+    def _db(self):
+        # Opened on first use so importing the module has no side effects
+        if self._connection is None and self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS explanations ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS explanations_accessed ON explanations (accessed)")
+            self._connection.commit()
+            self._disk_entries = self._connection.execute("SELECT COUNT(*) FROM explanations").fetchone()[0]
+        return self._connection
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if now - created < self.ttl:
+                    self.memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self.memory[key]
+
+            db = self._db()
+            if db is not None:
+                row = db.execute(
+                    "SELECT value, created FROM explanations WHERE key = ? AND created > ?",
+                    (key, now - self.ttl)
+                ).fetchone()
+                if row is not None:
+                    db.execute("UPDATE explanations SET accessed = ? WHERE key = ?", (now, key))
+                    db.commit()
+                    self._remember(key, row[0], row[1])
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+
+            db = self._db()
+            if db is not None:
+                inserted = db.execute(
+                    "INSERT OR IGNORE INTO explanations (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now)
+                ).rowcount
+                if inserted:
+                    self._disk_entries += 1
+                else:
+                    db.execute(
+                        "UPDATE explanations SET value = ?, created = ?, accessed = ? WHERE key = ?",
+                        (value, now, now, key)
+                    )
+                if self._disk_entries > self.max_disk_entries:
+                    self._evict(db, now)
+                db.commit()
+
+    def _remember(self, key, value, created):
+        self.memory[key] = (value, created)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def _evict(self, db, now):
+        db.execute("DELETE FROM explanations WHERE created <= ?", (now - self.ttl,))
+        # Recounted here, as other processes may share the file
+        target = int(self.max_disk_entries * (1 - EVICT_FRACTION))
+        excess = db.execute("SELECT COUNT(*) FROM explanations").fetchone()[0] - target
+        if excess > 0:
+            db.execute(
+                "DELETE FROM explanations WHERE key IN "
+                "(SELECT key FROM explanations ORDER BY accessed LIMIT ?)",
+                (excess,)
+            )
+        self._disk_entries = db.execute("SELECT COUNT(*) FROM explanations").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self.memory.clear()
+            db = self._db()
+            if db is not None:
+                db.execute("DELETE FROM explanations")
+                db.commit()
+                self._disk_entries = 0
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+        }
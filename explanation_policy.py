@@ -0,0 +1,98 @@
+"""
+Which explanation a scored transaction gets, and what that saved.
+
+Tiers:
+    template   confident verdicts keep the detector's pattern explanation
+    llm        borderline cases get a synchronous LLM explanation
+    deferred   everything else keeps the template until someone asks for
+               the LLM explanation (explain_on_demand)
+
+Environment:
+    EXPLANATION_POLICY=tiered|always_llm|template_only   (default tiered)
+    EXPLANATION_CONFIDENT_LOW / EXPLANATION_CONFIDENT_HIGH
+        probabilities at or below / at or above which a verdict is confident
+"""
+import os
+import threading
+from fraud_detector import get_detector
+import telemetry
+
+TEMPLATE = "template"
+LLM = "llm"
+DEFERRED = "deferred"
+ON_DEMAND = "on_demand"
+
+MODES = ("tiered", "always_llm", "template_only")
+
+DEFAULT_MODE = os.getenv("EXPLANATION_POLICY", "tiered")
+DEFAULT_CONFIDENT_LOW = float(os.getenv("EXPLANATION_CONFIDENT_LOW", 0.1))
+DEFAULT_CONFIDENT_HIGH = float(os.getenv("EXPLANATION_CONFIDENT_HIGH", 0.9))
+
+
+class ExplanationPolicy:
+    def __init__(self, mode=DEFAULT_MODE, confident_low=DEFAULT_CONFIDENT_LOW,
+                 confident_high=DEFAULT_CONFIDENT_HIGH):
+        if mode not in MODES:
+            raise ValueError(f"Unknown explanation policy {mode!r}, expected one of {MODES}")
+        self.mode = mode
+        self.confident_low = confident_low
+        self.confident_high = confident_high
+        self._lock = threading.Lock()
+        self.counts = {TEMPLATE: 0, LLM: 0, DEFERRED: 0, ON_DEMAND: 0}
+
+    def tier(self, fraud_result):
+        """
+        The tier for a detector result (without counting it).
+        """
+        if self.mode == "always_llm":
+            return LLM
+        if self.mode == "template_only":
+            return TEMPLATE
+        if fraud_result.get("is_borderline"):
+            return LLM
+        confidence = fraud_result["confidence"]
+        if confidence <= self.confident_low or confidence >= self.confident_high:
+            return TEMPLATE
+        return DEFERRED
+
+    def record(self, tier, n=1):
+        with self._lock:
+            self.counts[tier] += n
+        telemetry.count("explanations", n, tier=tier)
+
+    def choose(self, fraud_result):
+        """
+        tier() plus counting the decision.
+        """
+        tier = self.tier(fraud_result)
+        self.record(tier)
+        return tier
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+        decided = counts[TEMPLATE] + counts[LLM] + counts[DEFERRED]
+        llm_calls = counts[LLM] + counts[ON_DEMAND]
+        return {
+            "mode": self.mode,
+            "tiers": counts,
+            "llm_calls": llm_calls,
+            "llm_calls_avoided": max(decided - llm_calls, 0),
+        }
+
+
+policy = ExplanationPolicy()
+
+
+def explain_on_demand(transaction, fraud_result=None, patterns=None):
+    """
+    LLM explanation requested by a user (e.g. a transaction expanded in the
+    UI). Scores the transaction first when no result is given.
+    """
+    from llm_chain import process_transaction
+
+    if fraud_result is None:
+        fraud_result, patterns = get_detector().score(transaction)
+    policy.record(ON_DEMAND)
+    return process_transaction(transaction, fraud_result, patterns or [],
+                               is_borderline=bool(fraud_result.get("is_borderline", False)))
@@ -1,141 +1,477 @@
-import joblib
-import json
-import pandas as pd
-import logging
-
-# Set up logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-class FraudDetector:
-    def __init__(self):
-        try:
-            # Load the trained XGBoost model
-            self.model = joblib.load('models/fraud_model.pkl')
-            
-            # Load the RobustScaler for Amount
-            self.scaler = joblib.load('models/amount_scaler.pkl')
-            
-            # Load model metadata
-            with open('models/model_metadata.json', 'r') as f:
-                self.metadata = json.load(f)
-            
-            # Load fraud patterns
-            self.fraud_patterns = pd.read_csv('models/aligned_fraud_patterns.csv')
-            
-            logger.info("FraudDetector initialized successfully.")
-        except Exception as e:
-            logger.error(f"Error initializing FraudDetector: {e}")
-            raise
-
-    def predict(self, transaction):
-        try:
-            # Scale Amount
-            scaled_amount = self.scaler.transform([[transaction['Amount']]])[0][0]
-            
-            # Initialize all features to 0.0
-            all_features = {feature: 0.0 for feature in self.metadata['feature_names']}
-            
-            # Update with the provided features
-            for key, value in transaction.items():
-                if key in all_features:
-                    all_features[key] = value
-            
-            # Convert to DataFrame with feature names
-            features_df = pd.DataFrame([all_features])[self.metadata['feature_names']]
-            
-            # Predict fraud probability
-            prob = self.model.predict_proba(features_df)[0][1]
-            
-            # Determine if the case is borderline
-            is_borderline = 0.3 <= prob <= 0.7  # Adjust thresholds as needed
-            
-            # Use optimal threshold from metadata
-            is_fraud = prob >= self.metadata['optimal_threshold']
-            
-            # Generate enhanced explanation
-            risk_factors = [
-                f"{key} ({value:.2f})" 
-                for key, value in transaction.items() 
-                if key in self.metadata['top_features']['Feature'].values()
-            ][:3]
-            
-            # Get matching patterns
-            matching_patterns = self.get_relevant_patterns(transaction)
-            pattern_explanation = "\n".join([
-                f"- {p['feature']} {p['condition']}: {p['description']}"
-                for p in matching_patterns
-            ])
-            
-            explanation = (
-                f"Risk factors: {', '.join(risk_factors)}\n"
-                f"Matching patterns:\n{pattern_explanation}"
-            )
-            
-            # If borderline, delegate to LLM for further analysis
-            if is_borderline:
-                llm_verdict = self.llm_judgment(transaction, prob, matching_patterns)
-                return {
-                    "fraud": llm_verdict["fraud"],
-                    "confidence": float(prob),
-                    "explanation": llm_verdict["explanation"],
-                    "is_borderline": True
-                }
-            else:
-                return {
-                    "fraud": bool(is_fraud),
-                    "confidence": float(prob),
-                    "explanation": explanation,
-                    "is_borderline": False
-                }
-        except Exception as e:
-            logger.error(f"Error predicting fraud: {e}")
-            return {"error": str(e)}
-
-    def get_relevant_patterns(self, transaction):
-        relevant_patterns = []
-        # Pre-filter patterns based on transaction features
-        filtered_patterns = self.fraud_patterns[self.fraud_patterns['feature'].isin(transaction.keys())]
-        
-        for _, row in filtered_patterns.iterrows():
-            feature = row['feature']
-            condition = row['condition']
-            value = transaction[feature]
-            
-            # Evaluate condition
-            if ">" in condition:
-                threshold = float(condition.split(">")[1].strip())
-                if value > threshold:
-                    relevant_patterns.append(row.to_dict())
-            elif "<" in condition:
-                threshold = float(condition.split("<")[1].strip())
-                if value < threshold:
-                    relevant_patterns.append(row.to_dict())
-        
-        return relevant_patterns
-
-    def llm_judgment(self, transaction, prob, matching_patterns):
-        """
-        Delegate borderline cases to the LLM for further analysis.
-        """
-        # Generate LLM explanation
-        explanation = (
-            "The model is unsure about this transaction. Analyzing further...\n"
-            f"Fraud Probability: {prob * 100:.2f}%\n"
-            f"Matching Patterns:\n"
-        )
-        for pattern in matching_patterns:
-            explanation += f"- {pattern['feature']} {pattern['condition']}: {pattern['description']}\n"
-        
-        # LLM logic to make a final judgment
-        if prob >= 0.5:  # Adjust as needed
-            verdict = True
-            explanation += "\nFinal Verdict: 🚨 Fraud Detected (LLM Judgment)"
-        else:
-            verdict = False
-            explanation += "\nFinal Verdict: ✅ Legitimate (LLM Judgment)"
-        
-        return {
-            "fraud": verdict,
-            "explanation": explanation
+import joblib
+import json
+import numpy as np
+import pandas as pd
+import logging
+import os
+from native_engine import (NativeEngine, export_native, file_digest, native_stale, top_contributions,
+                           MODEL_PATH, SCALER_PATH, NATIVE_MODEL_PATH, NATIVE_SCALER_PATH)
+from pattern_matcher import PatternMatcher
+import cascade
+from score_cache import ScoreCache, DEFAULT_MAX_ENTRIES as SCORE_CACHE_SIZE, row_keys
+import telemetry
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Probability band in which the model is considered unsure
+BORDERLINE_LOW = 0.3
+BORDERLINE_HIGH = 0.7
+
+# Cut-off used by llm_judgment for borderline cases
+LLM_VERDICT_THRESHOLD = 0.5
+
+# Rows scored per booster call in predict_batch
+DEFAULT_BATCH_SIZE = 50000
+
+# Larger batches (e.g. offline files) bypass the score cache instead of flushing it
+CACHE_MAX_BATCH_ROWS = 10000
+
+# Features with the largest contributions listed as risk factors of fraud and
+# borderline results (0 turns them off); confident legitimate scores skip them
+DEFAULT_TOP_DRIVERS = int(os.getenv("EXPLANATION_TOP_DRIVERS", 3))
+
+METADATA_PATH = "models/model_metadata.json"
+PATTERNS_PATH = "models/aligned_fraud_patterns.csv"
+
+def _copy_drivers(drivers):
+    return [dict(driver) for driver in drivers]
+
+def _copy_result(result):
+    """
+    A result dict that shares no mutable state with `result`.
+    """
+    result = dict(result)
+    if result.get("drivers") is not None:
+        result["drivers"] = _copy_drivers(result["drivers"])
+    return result
+
+def format_drivers(drivers):
+    return ", ".join(f"{d['feature']} ({d['value']:.2f}, {d['contribution']:+.2f} log-odds)" for d in drivers)
+
+def get_detector():
+    """
+    The process-wide FraudDetector shared by the UI, the workflow and the
+    API, loaded on first use. After a hot reload this is the new version.
+    """
+    from model_registry import get_registry
+
+    return get_registry().current
+
+class FraudDetector:
+    def __init__(self):
+        try:
+            # Pickled sklearn objects are only loaded on demand (see the model/scaler properties)
+            self._model = None
+            self._scaler = None
+            
+            # Load model metadata
+            with open(METADATA_PATH, 'r') as f:
+                self.metadata = json.load(f)
+            
+            # Load the native XGBoost booster, exporting it when the pickles changed
+            if native_stale():
+                export_native()
+            self.engine = NativeEngine(self.metadata['feature_names'])
+            self.top_drivers = DEFAULT_TOP_DRIVERS
+            
+            # Load fraud patterns
+            self.fraud_patterns = pd.read_csv(PATTERNS_PATH)
+            self.pattern_matcher = PatternMatcher(self.fraud_patterns)
+
+            # Optional pre-filter that clears low-risk rows before the booster (see cascade.py)
+            self.cascade = None
+            # Set when the cascade on disk was fitted for another booster
+            self.cascade_stale = False
+            if cascade.ENABLED and os.path.exists(cascade.CASCADE_PATH):
+                loaded = cascade.CascadeFilter.load(self.metadata['feature_names'])
+                if loaded.model_digest == self.engine.model_digest:
+                    self.cascade = loaded
+                    logger.info(f"Cascade pre-filter enabled on {self.cascade.features}")
+                else:
+                    # Its cutoff was calibrated on another model's scores, so its recall doesn't hold here
+                    self.cascade_stale = True
+                    logger.warning(f"Cascade pre-filter disabled: fitted for model {loaded.model_digest}, "
+                                   f"the loaded model is {self.engine.model_digest}. Refit it with cascade.py fit")
+
+            # The metadata's version plus a digest of the loaded artifacts, so
+            # replacing any of them gives a new version (e.g. 1.0.0+3f2a9c1d)
+            artifacts = [NATIVE_MODEL_PATH, NATIVE_SCALER_PATH, METADATA_PATH, PATTERNS_PATH]
+            if self.cascade is not None:
+                artifacts.append(cascade.CASCADE_PATH)
+            self.model_version = f"{self.metadata.get('model_version', '1.0.0')}+{file_digest(artifacts)}"
+
+            # Results of exact duplicate transactions, for this model version only
+            self.cache = ScoreCache(self.model_version) if SCORE_CACHE_SIZE > 0 else None
+            
+            logger.info("FraudDetector initialized successfully.")
+        except Exception as e:
+            logger.error(f"Error initializing FraudDetector: {e}")
+            raise
+
+    @property
+    def model(self):
+        """
+        The pickled XGBClassifier, kept for parity checks and sklearn tooling.
+        """
+        if self._model is None:
+            self._model = joblib.load(MODEL_PATH)
+        return self._model
+
+    @property
+    def scaler(self):
+        if self._scaler is None:
+            self._scaler = joblib.load(SCALER_PATH)
+        return self._scaler
+
+    def warm_up(self):
+        """
+        Run the scoring paths once on an all-zero row so the first request
+        doesn't pay their one-time costs. Nothing is counted or cached.
+        """
+        feature_names = self.metadata['feature_names']
+        values = np.zeros((1, len(feature_names)), dtype=np.float32)
+        self.engine.predict_row(values)
+        if self.top_drivers:
+            self.engine.predict_contributions(values)
+        self.pattern_matcher.match_records(pd.DataFrame(values, columns=feature_names))
+
+    def predict(self, transaction):
+        return self.score(transaction)[0]
+
+    def score(self, transaction):
+        """
+        Same as predict, but also returns the matching patterns so callers
+        (e.g. the workflow) do not have to match them a second time.
+        """
+        matching_patterns = []
+        try:
+            # Predict fraud probability (missing features are zero-filled in the engine's buffer)
+            with telemetry.stage("align"):
+                row = self.engine.fill_row(transaction)
+            if self.cache is not None:
+                key = self._cache_key(transaction)
+                cached = self.cache.get(key)
+                if cached is not None:
+                    telemetry.count("score_cache_hits")
+                    self._count(cached[0])
+                    # Copies, so callers can't alter the cached entry
+                    return _copy_result(cached[0]), list(cached[1])
+            with telemetry.stage("predict_proba"):
+                if self.cascade is None:
+                    prob = self.engine.predict_row(row)
+                else:
+                    prob = float(self.predict_proba(row)[0])
+                # Drivers only for fraud and borderline scores, as in flagged_drivers
+                drivers = None
+                if self.top_drivers and (prob >= self.metadata['optimal_threshold']
+                                         or BORDERLINE_LOW <= prob <= BORDERLINE_HIGH):
+                    drivers = self.predict_with_drivers(row, self.top_drivers)[1][0]
+            
+            # Get matching patterns
+            matching_patterns = self.get_relevant_patterns(transaction)
+            
+            with telemetry.stage("verdict"):
+                result = self.build_result(transaction, prob, matching_patterns, drivers)
+            if self.cache is not None:
+                self.cache.put(key, (_copy_result(result), list(matching_patterns)))
+            self._count(result)
+            return result, matching_patterns
+        except Exception as e:
+            logger.error(f"Error predicting fraud: {e}")
+            return {"error": str(e)}, matching_patterns
+
+    def _cache_key(self, transaction):
+        # Which features were given, and in what order, shapes the patterns and explanation too
+        present = tuple(key for key in transaction if key in self.engine.feature_index)
+        # The given float64 values rather than the float32 row: the patterns are matched on them,
+        # and two values the cast rounds together can fall on either side of a pattern threshold
+        values = np.array([transaction[key] for key in present], dtype=np.float64)
+        return values.tobytes(), present
+
+    def _count(self, result):
+        telemetry.count("requests")
+        if result["fraud"]:
+            telemetry.count("fraud")
+        if result["is_borderline"]:
+            telemetry.count("borderline")
+
+    def build_result(self, transaction, prob, matching_patterns, drivers=None):
+        """
+        Turn a fraud probability and its matching patterns into the result dict
+        returned by predict. `drivers` are the row's largest feature
+        contributions (see predict_with_drivers); without them the risk
+        factors are the top features present in the transaction.
+        """
+        # Determine if the case is borderline
+        is_borderline = BORDERLINE_LOW <= prob <= BORDERLINE_HIGH
+        
+        # Use optimal threshold from metadata
+        is_fraud = prob >= self.metadata['optimal_threshold']
+        
+        # Generate enhanced explanation
+        if drivers:
+            risk_factors = [format_drivers(drivers)]
+        else:
+            risk_factors = [
+                f"{key} ({value:.2f})" 
+                for key, value in transaction.items() 
+                if key in self.metadata['top_features']['Feature'].values()
+            ][:3]
+        
+        pattern_explanation = "\n".join([
+            f"- {p['feature']} {p['condition']}: {p['description']}"
+            for p in matching_patterns
+        ])
+        
+        explanation = (
+            f"Risk factors: {', '.join(risk_factors)}\n"
+            f"Matching patterns:\n{pattern_explanation}"
+        )
+        
+        # If borderline, delegate to LLM for further analysis
+        if is_borderline:
+            llm_verdict = self.llm_judgment(transaction, prob, matching_patterns)
+            result = {
+                "fraud": llm_verdict["fraud"],
+                "confidence": float(prob),
+                "explanation": llm_verdict["explanation"],
+                "is_borderline": True
+            }
+        else:
+            result = {
+                "fraud": bool(is_fraud),
+                "confidence": float(prob),
+                "explanation": explanation,
+                "is_borderline": False
+            }
+        if drivers is not None:
+            result["drivers"] = drivers
+        result["model_version"] = self.model_version
+        return result
+
+    def score_many(self, transactions):
+        """
+        List-of-dicts counterpart of score: one booster call and one
+        pattern-matching pass for all transactions. Returns (result, patterns)
+        pairs in input order.
+        """
+        frame = pd.DataFrame.from_records(transactions)
+        # Omitted features are NaN for pattern matching and zero-filled for the model, as in predict
+        with telemetry.stage("predict_batch"):
+            features = self.align_features(frame.fillna(0.0))
+            scores = self.predict_batch(features)
+            probs = scores["confidence"].to_numpy()
+            drivers = self.flagged_drivers(features.to_numpy(dtype=np.float32), probs)
+        with telemetry.stage("patterns_batch"):
+            patterns = self.pattern_matcher.match_records(frame)
+        with telemetry.stage("verdict_batch"):
+            results = [
+                (self.build_result(transaction, prob, row_patterns, row_drivers), row_patterns)
+                for transaction, prob, row_patterns, row_drivers in zip(transactions, probs, patterns, drivers)
+            ]
+        for result, _ in results:
+            self._count(result)
+        return results
+
+    def predict_batch(self, data, batch_size=DEFAULT_BATCH_SIZE, top_k=0):
+        """
+        Score a DataFrame (or 2-D array ordered like metadata['feature_names'])
+        in bulk. Returns a DataFrame with the same index and the columns
+        'confidence', 'fraud' and 'is_borderline', matching predict row by row.
+        With top_k, a 'drivers' column holds each row's top_k feature
+        contributions, computed in the same booster pass.
+        """
+        features = self.align_features(data)
+
+        drivers = None
+        if self.cache is not None and len(features) <= CACHE_MAX_BATCH_ROWS:
+            entries = self._predict_cached(features.to_numpy(dtype=np.float32), top_k)
+            if top_k:
+                probs = np.array([prob for prob, _ in entries], dtype=np.float64)
+                drivers = [row_drivers for _, row_drivers in entries]
+            else:
+                probs = np.array(entries, dtype=np.float64)
+        else:
+            probs = np.empty(len(features), dtype=np.float64)
+            drivers = [] if top_k else None
+            for start in range(0, len(features), batch_size):
+                chunk = features.iloc[start:start + batch_size].to_numpy(dtype=np.float32)
+                if top_k:
+                    probs[start:start + len(chunk)], chunk_drivers = self.predict_with_drivers(chunk, top_k)
+                    drivers.extend(chunk_drivers)
+                else:
+                    probs[start:start + len(chunk)] = self.predict_proba(chunk)
+
+        scores = pd.DataFrame(self.verdicts(probs), index=features.index)
+        if drivers is not None:
+            scores["drivers"] = drivers
+        return scores
+
+    def predict_proba(self, values):
+        """
+        Fraud probabilities for a 2-D float32 array ordered like
+        metadata['feature_names']. With a cascade, rows it clears get its
+        estimate and only the rest go through the booster.
+        """
+        if self.cascade is None:
+            return self.engine.predict_proba(values)
+        probs, cleared = self.cascade.screen(values)
+        remaining = ~cleared
+        if remaining.any():
+            probs[remaining] = self.engine.predict_proba(values[remaining])
+        telemetry.count("cascade_cleared", int(cleared.sum()))
+        return probs
+
+    def predict_with_drivers(self, values, top_k=DEFAULT_TOP_DRIVERS):
+        """
+        predict_proba plus each row's top_k drivers: the features with the
+        largest contributions to the log-odds, as dicts of feature, value and
+        contribution. Rows cleared by the cascade get the filter's terms.
+        """
+        values = np.ascontiguousarray(values, dtype=np.float32)
+        probs = np.empty(len(values), dtype=np.float64)
+        contributions = np.zeros(values.shape, dtype=np.float32)
+        remaining = np.ones(len(values), dtype=bool)
+        if self.cascade is not None:
+            estimates, cleared = self.cascade.screen(values)
+            probs[cleared] = estimates[cleared]
+            contributions[np.ix_(cleared, self.cascade.columns)] = self.cascade.contributions(values[cleared])
+            remaining = ~cleared
+            telemetry.count("cascade_cleared", int(cleared.sum()))
+        if remaining.any():
+            probs[remaining], contributions[remaining] = self.engine.predict_contributions(values[remaining])
+
+        columns, top = top_contributions(contributions, top_k)
+        names = self.engine.feature_names
+        drivers = [
+            [
+                {"feature": names[j], "value": float(row_values[j]), "contribution": round(c, 4)}
+                for j, c in zip(row_columns, row_top)
+            ]
+            for row_values, row_columns, row_top in zip(values, columns.tolist(), top.tolist())
+        ]
+        return probs, drivers
+
+    def flagged_drivers(self, values, probs, top_k=None):
+        """
+        predict_with_drivers' drivers for the fraud and borderline rows of
+        `values` given their probabilities, None for the other rows.
+        Contributions cost a few times the plain prediction, so the
+        confident legitimate majority goes without.
+        """
+        top_k = self.top_drivers if top_k is None else top_k
+        drivers = [None] * len(probs)
+        if not top_k:
+            return drivers
+        verdicts = self.verdicts(probs)
+        flagged = np.flatnonzero(verdicts["fraud"] | verdicts["is_borderline"])
+        if len(flagged):
+            _, flagged_drivers = self.predict_with_drivers(values[flagged], top_k)
+            for i, row_drivers in zip(flagged, flagged_drivers):
+                drivers[i] = row_drivers
+        return drivers
+
+    def _predict_cached(self, values, top_k=0):
+        """
+        Probabilities (or, with top_k, (probability, drivers) pairs) for
+        aligned float32 rows, scoring only the rows that are neither cached
+        nor repeated earlier in the same batch.
+        """
+        keys = row_keys(values)
+        if top_k:
+            # Entries with drivers are kept apart from plain probabilities
+            keys = [(key, top_k) for key in keys]
+        cached = self.cache.get_many(keys)
+        # First row of each distinct uncached vector
+        first = {}
+        for i, (key, prob) in enumerate(zip(keys, cached)):
+            if prob is None and key not in first:
+                first[key] = i
+        if first:
+            rows = np.fromiter(first.values(), dtype=np.intp, count=len(first))
+            if top_k:
+                probs, drivers = self.predict_with_drivers(values[rows], top_k)
+                fresh = list(zip(probs.tolist(), drivers))
+            else:
+                fresh = self.predict_proba(values[rows]).tolist()
+            self.cache.put_many(first, fresh)
+            found = dict(zip(first, fresh))
+            cached = [found[key] if prob is None else prob for key, prob in zip(keys, cached)]
+        telemetry.count("score_cache_hits", len(keys) - len(first))
+        if top_k:
+            # Copies, so callers can't alter the cached drivers
+            cached = [(prob, _copy_drivers(drivers)) for prob, drivers in cached]
+        return cached
+
+    def verdicts(self, probs):
+        """
+        Vectorized verdicts for an array of probabilities, as predict would give
+        them: {'confidence', 'fraud', 'is_borderline'} arrays.
+        """
+        probs = np.asarray(probs, dtype=np.float64)
+        is_borderline = (probs >= BORDERLINE_LOW) & (probs <= BORDERLINE_HIGH)
+        # Borderline rows get the llm_judgment cut-off, the rest the optimal threshold
+        is_fraud = np.where(
+            is_borderline,
+            probs >= LLM_VERDICT_THRESHOLD,
+            probs >= self.metadata['optimal_threshold']
+        )
+        return {
+            "confidence": probs,
+            "fraud": is_fraud,
+            "is_borderline": is_borderline
+        }
+
+    def align_features(self, data):
+        """
+        Reorder columns to metadata['feature_names'] and zero-fill the missing ones.
+        """
+        feature_names = self.metadata['feature_names']
+
+        if isinstance(data, pd.DataFrame):
+            return data.reindex(columns=feature_names, fill_value=0.0)
+
+        values = np.asarray(data, dtype=np.float64)
+        if values.ndim != 2 or values.shape[1] != len(feature_names):
+            raise ValueError(
+                f"Expected a 2-D array with {len(feature_names)} columns, got shape {values.shape}"
+            )
+        return pd.DataFrame(values, columns=feature_names)
+
+    def get_relevant_patterns(self, transaction):
+        with telemetry.stage("patterns"):
+            return self.pattern_matcher.match_records(transaction)[0]
+
+    def get_relevant_patterns_batch(self, data):
+        """
+        Matching patterns for every row of a DataFrame, one list per row.
+        """
+        return self.pattern_matcher.match_records(data)
+
+    def llm_judgment(self, transaction, prob, matching_patterns):
+        """
+        Delegate borderline cases to the LLM for further analysis.
+        """
+        # Generate LLM explanation
+        explanation = (
+            "The model is unsure about this transaction. Analyzing further...\n"
+            f"Fraud Probability: {prob * 100:.2f}%\n"
+            f"Matching Patterns:\n"
+        )
+        for pattern in matching_patterns:
+            explanation += f"- {pattern['feature']} {pattern['condition']}: {pattern['description']}\n"
+        
+        # LLM logic to make a final judgment
+        if prob >= LLM_VERDICT_THRESHOLD:
+            verdict = True
+            explanation += "\nFinal Verdict: 🚨 Fraud Detected (LLM Judgment)"
+        else:
+            verdict = False
+            explanation += "\nFinal Verdict: ✅ Legitimate (LLM Judgment)"
+        
+        return {
+            "fraud": verdict,
+            "explanation": explanation
         }
\ No newline at end of file
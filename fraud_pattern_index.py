@@ -1,33 +1,221 @@
-from llama_index.core import Document  # Add this import
-from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, StorageContext
-from langchain_huggingface import HuggingFaceEmbeddings  # Updated import
-import pandas as pd
-
-# Load aligned fraud patterns
-fraud_patterns = pd.read_csv("models/aligned_fraud_patterns.csv")
-
-# Create structured documents using LlamaIndex Document objects
-documents = []
-for _, row in fraud_patterns.iterrows():
-    text = f"""
-    **Pattern Type**: {row['fraud_type']}
-    **Feature**: {row['feature']}
-    **Condition**: {row['condition']}
-    **Risk Level**: {row['risk_level']}
-    **Description**: {row['description']}
-    """
-    # Create Document instance instead of dict
-    documents.append(Document(
-        text=text,
-        metadata=row.to_dict(),
-        excluded_llm_metadata_keys=["feature", "condition"]  # Optional: exclude technical fields
-    ))
-
-# Build and save index
-index = VectorStoreIndex.from_documents(
-    documents,
-    embed_model=HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2"),
-    show_progress=True
-)
-index.storage_context.persist(persist_dir="data/fraud_patterns_index")
-print("✅ Fraud pattern index updated successfully!")
\ No newline at end of file
+"""
+Build the fraud pattern index from models/aligned_fraud_patterns.csv.
+
+Vectors are stored as a float32 `vectors.npy` (L2-normalized, one row per
+pattern) with a `patterns.json` sidecar holding each row's content hash and
+fields and a checksum of `vectors.npy`, so loading is a memory map and a
+vectors file from another build is rejected. Rebuilds are incremental: only patterns
+whose content hash is new are embedded, in batches; vectors of unchanged
+patterns are reused from the previous build. The first build embeds every
+pattern: vectors of the llama_index store were embedded from different text
+and are never reused.
+
+Usage:
+    python fraud_pattern_index.py                 # incremental rebuild
+    python fraud_pattern_index.py --full          # re-embed everything
+    python fraud_pattern_index.py --llama-index   # also persist a llama_index store
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+PATTERNS_PATH = "models/aligned_fraud_patterns.csv"
+INDEX_DIR = "data/fraud_patterns_index"
+VECTORS_FILE = "vectors.npy"
+SIDECAR_FILE = "patterns.json"
+LLAMA_VECTOR_STORE_FILE = "default__vector_store.json"
+EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Texts per embed_documents call
+EMBED_BATCH_SIZE = 256
+
+PATTERN_FIELDS = ["feature", "condition", "risk_level", "description", "fraud_type"]
+
+
+def pattern_text(pattern):
+    return f"""
+    **Pattern Type**: {pattern['fraud_type']}
+    **Feature**: {pattern['feature']}
+    **Condition**: {pattern['condition']}
+    **Risk Level**: {pattern['risk_level']}
+    **Description**: {pattern['description']}
+    """.strip()
+
+
+def content_hash(pattern, model_name=EMBED_MODEL):
+    """
+    Identity of a pattern's embedding: changes with its text or the model.
+    """
+    return hashlib.sha256(f"{model_name}\n{pattern_text(pattern)}".encode("utf-8")).hexdigest()
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def vectors_digest(path):
+    """
+    SHA-256 of a vectors file's bytes.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_vectors(index_dir=INDEX_DIR, mmap=True):
+    """
+    (vectors, entries) of a binary index, or None if there is none. vectors
+    is memory-mapped unless mmap is False; entries are the sidecar dicts.
+    Raises ValueError if the two files are not from the same build.
+    """
+    vectors_path = os.path.join(index_dir, VECTORS_FILE)
+    sidecar_path = os.path.join(index_dir, SIDECAR_FILE)
+    if not (os.path.exists(vectors_path) and os.path.exists(sidecar_path)):
+        return None
+    with open(sidecar_path, "r") as f:
+        sidecar = json.load(f)
+    entries = sidecar["patterns"]
+    # A build interrupted between the two files leaves vectors its sidecar doesn't describe
+    if sidecar.get("vectors_sha256") != vectors_digest(vectors_path):
+        raise ValueError(f"{vectors_path} does not match the checksum in {sidecar_path}; "
+                         f"rebuild it with fraud_pattern_index.py --full")
+    vectors = np.load(vectors_path, mmap_mode="r" if mmap else None)
+    if len(vectors) != len(entries):
+        raise ValueError(f"{vectors_path} has {len(vectors)} rows but {sidecar_path} lists {len(entries)} patterns")
+    return vectors, entries
+
+
+def known_vectors(index_dir=INDEX_DIR):
+    """
+    Previously computed vectors by content hash, from the binary index.
+    An inconsistent index is not reused: everything is embedded again.
+    """
+    try:
+        existing = load_vectors(index_dir, mmap=True)
+    except ValueError as e:
+        logger.warning(f"Not reusing the previous vectors: {e}")
+        return {}
+    if existing is None:
+        return {}
+    vectors, entries = existing
+    return {entry["id"]: vectors[i] for i, entry in enumerate(entries)}
+
+
+def _write_atomic(path, write):
+    # Written beside the target and renamed over it, so readers never see a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def build_index(patterns_path=PATTERNS_PATH, index_dir=INDEX_DIR, model_name=EMBED_MODEL,
+                batch_size=EMBED_BATCH_SIZE, full=False, embed_documents=None):
+    """
+    (Re)build the binary index, embedding only new or changed patterns.
+    `embed_documents` maps a list of texts to vectors; by default the
+    HuggingFace model is loaded when something needs embedding. Returns
+    (number of patterns, number embedded).
+    """
+    patterns = pd.read_csv(patterns_path)[PATTERN_FIELDS].to_dict("records")
+    ids = [content_hash(p, model_name) for p in patterns]
+    known = {} if full else known_vectors(index_dir)
+
+    missing = [i for i, pattern_id in enumerate(ids) if pattern_id not in known]
+    # Duplicate rows share one embedding call
+    to_embed = list(dict.fromkeys(ids[i] for i in missing))
+    texts = {ids[i]: pattern_text(patterns[i]) for i in missing}
+
+    embedded = {}
+    if to_embed:
+        if embed_documents is None:
+            from langchain_huggingface import HuggingFaceEmbeddings
+
+            embed_documents = HuggingFaceEmbeddings(model_name=model_name).embed_documents
+        for start in range(0, len(to_embed), batch_size):
+            batch = to_embed[start:start + batch_size]
+            for pattern_id, vector in zip(batch, embed_documents([texts[b] for b in batch])):
+                embedded[pattern_id] = vector
+            logger.info(f"Embedded {min(start + batch_size, len(to_embed))}/{len(to_embed)} patterns")
+
+    vectors = normalize(np.stack([
+        embedded[pattern_id] if pattern_id in embedded else known[pattern_id] for pattern_id in ids
+    ])) if ids else np.zeros((0, 0), dtype=np.float32)
+    # Release the memory map of the old vectors before replacing the file
+    del known
+
+    os.makedirs(index_dir, exist_ok=True)
+    vectors_path = os.path.join(index_dir, VECTORS_FILE)
+    # Write vectors before the sidecar holding their checksum; load_vectors rejects a mismatched pair
+    _write_atomic(vectors_path, lambda path: _save_npy(path, vectors))
+    sidecar = {
+        "model": model_name,
+        "dimension": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+        "vectors_sha256": vectors_digest(vectors_path),
+        "patterns": [{"id": pattern_id, **pattern} for pattern_id, pattern in zip(ids, patterns)],
+    }
+    _write_atomic(os.path.join(index_dir, SIDECAR_FILE), lambda path: _save_json(path, sidecar))
+
+    logger.info(f"Index has {len(ids)} patterns, {len(to_embed)} embedded, {len(ids) - len(missing)} reused")
+    return len(ids), len(to_embed)
+
+
+def _save_npy(path, vectors):
+    with open(path, "wb") as f:
+        np.save(f, vectors)
+
+
+def _save_json(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f, indent=1)
+
+
+def persist_llama_index(index_dir=INDEX_DIR, model_name=EMBED_MODEL):
+    """
+    Persist a llama_index store from the binary index, reusing its vectors.
+    """
+    from llama_index.core import VectorStoreIndex
+    from llama_index.core.schema import TextNode
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    vectors, entries = load_vectors(index_dir)
+    nodes = [
+        TextNode(
+            text=pattern_text(entry),
+            metadata={field: entry[field] for field in PATTERN_FIELDS},
+            excluded_llm_metadata_keys=["feature", "condition"],
+            embedding=vector.tolist(),
+        )
+        for entry, vector in zip(entries, vectors)
+    ]
+    index = VectorStoreIndex(nodes, embed_model=HuggingFaceEmbeddings(model_name=model_name))
+    index.storage_context.persist(persist_dir=index_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patterns", default=PATTERNS_PATH)
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--full", action="store_true", help="Re-embed every pattern")
+    parser.add_argument("--llama-index", action="store_true", help="Also persist a llama_index vector store")
+    args = parser.parse_args()
+
+    total, embedded = build_index(args.patterns, args.index_dir, batch_size=args.batch_size, full=args.full)
+    if args.llama_index:
+        persist_llama_index(args.index_dir)
+    print(f"✅ Fraud pattern index updated successfully! ({total} patterns, {embedded} embedded)")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,50 @@
+"""
+Production serving of the API: a gunicorn master pre-forks uvicorn workers.
+
+The master imports Api and loads the FraudDetector (model, scaler, compiled
+patterns) and the pattern index once; workers are forked from it and share
+those pages copy-on-write instead of each loading its own copy. No inference
+runs in the master (OpenMP is not fork-safe); each worker warms its model in
+the lifespan before /ready passes. Workers are recycled gracefully after a
+jittered number of requests, and `kill -HUP <master>` replaces them all.
+
+Usage:
+    gunicorn -c gunicorn.conf.py Api:app
+
+Environment:
+    BIND=0.0.0.0:8000
+    WEB_CONCURRENCY        workers (default: one per core)
+    MAX_REQUESTS=10000     requests before a worker is recycled (0 disables)
+    MAX_REQUESTS_JITTER=1000
+    PRELOAD_APP=0          load the model in every worker instead (for comparison)
+"""
+import gc
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = os.getenv("PRELOAD_APP", "1") != "0"
+
+# Recycling: jitter keeps workers from restarting at the same time
+max_requests = int(os.getenv("MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", 1000))
+
+# Seconds a recycled or stopped worker gets to finish in-flight requests
+graceful_timeout = 30
+timeout = 60
+keepalive = 5
+
+
+def when_ready(server):
+    if preload_app:
+        from Api import preload
+
+        preload()
+        server.log.info("Model preloaded in the master")
+
+
+def pre_fork(server, worker):
+    # Move everything loaded so far out of the collector's reach, so garbage
+    # collection in the workers doesn't write to (and copy) the shared pages
+    gc.freeze()
@@ -0,0 +1,125 @@
+"""
+Session history of analysed transactions for the dashboard.
+
+Recent transactions live in a fixed-capacity columnar ring buffer (one NumPy
+array per field), so appending never copies earlier rows and memory stays
+bounded. Per-hour counts, fraud counts and amount sums are updated as rows
+come in and cover everything ever added, including rows that have since
+been overwritten in the buffer.
+"""
+import numpy as np
+import pandas as pd
+
+# Recent transactions kept row by row; older ones only survive in the hourly totals
+DEFAULT_CAPACITY = 10000
+
+HOURS = 24
+
+
+class HistoryStore:
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.hour = np.zeros(capacity, dtype=np.int8)
+        self.fraud = np.zeros(capacity, dtype=bool)
+        self.confidence = np.zeros(capacity, dtype=np.float32)
+        self.amount = np.zeros(capacity, dtype=np.float64)
+        # Next slot to write and number of filled slots
+        self.position = 0
+        self.size = 0
+
+        self.hourly_count = np.zeros(HOURS, dtype=np.int64)
+        self.hourly_fraud = np.zeros(HOURS, dtype=np.int64)
+        self.hourly_amount = np.zeros(HOURS, dtype=np.float64)
+        self.hourly_fraud_amount = np.zeros(HOURS, dtype=np.float64)
+
+    def append(self, hour, fraud, amount, confidence=np.nan):
+        hour, fraud, amount = int(hour) % HOURS, bool(fraud), float(np.nan_to_num(amount))
+        self.hourly_count[hour] += 1
+        self.hourly_fraud[hour] += fraud
+        self.hourly_amount[hour] += amount
+        if fraud:
+            self.hourly_fraud_amount[hour] += amount
+
+        i = self.position
+        self.hour[i], self.fraud[i], self.amount[i], self.confidence[i] = hour, fraud, amount, confidence
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def extend(self, hours, fraud, amounts, confidence=None):
+        """
+        Add transactions given as parallel sequences. Only the last
+        `capacity` rows are kept in the buffer; all of them are aggregated.
+        """
+        hours = np.asarray(hours, dtype=np.int64) % HOURS
+        fraud = np.asarray(fraud, dtype=bool)
+        amounts = np.nan_to_num(np.asarray(amounts, dtype=np.float64))
+        confidence = np.full(len(hours), np.nan) if confidence is None else np.asarray(confidence, dtype=np.float32)
+
+        self.add_hourly(
+            np.bincount(hours, minlength=HOURS),
+            np.bincount(hours, weights=fraud, minlength=HOURS),
+            np.bincount(hours, weights=amounts, minlength=HOURS),
+            np.bincount(hours, weights=np.where(fraud, amounts, 0.0), minlength=HOURS),
+        )
+
+        n = len(hours)
+        if n > self.capacity:
+            # Earlier rows would be overwritten within this same call
+            hours, fraud, amounts, confidence = (a[-self.capacity:] for a in (hours, fraud, amounts, confidence))
+            self.position = (self.position + n - self.capacity) % self.capacity
+            n = self.capacity
+        slots = (self.position + np.arange(n)) % self.capacity
+        self.hour[slots] = hours
+        self.fraud[slots] = fraud
+        self.amount[slots] = amounts
+        self.confidence[slots] = confidence
+        self.position = (self.position + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def add_hourly(self, count, fraud, amount, fraud_amount=None):
+        """
+        Merge pre-aggregated 24-hour bins (e.g. of a streamed batch whose
+        rows are not kept) into the totals.
+        """
+        self.hourly_count += np.asarray(count, dtype=np.int64)
+        self.hourly_fraud += np.asarray(fraud, dtype=np.int64)
+        self.hourly_amount += np.asarray(amount, dtype=np.float64)
+        if fraud_amount is not None:
+            self.hourly_fraud_amount += np.asarray(fraud_amount, dtype=np.float64)
+
+    @property
+    def total(self):
+        return int(self.hourly_count.sum())
+
+    def hourly_frame(self):
+        return pd.DataFrame({
+            "hour": np.arange(HOURS),
+            "transactions": self.hourly_count,
+            "fraud_attempts": self.hourly_fraud,
+            "amount": self.hourly_amount,
+            "fraud_amount": self.hourly_fraud_amount,
+        })
+
+    def totals(self):
+        total = self.total
+        fraud = int(self.hourly_fraud.sum())
+        return {
+            "transactions": total,
+            "fraud": fraud,
+            "fraud_rate": fraud / total if total else 0.0,
+            "amount": float(self.hourly_amount.sum()),
+            "fraud_amount": float(self.hourly_fraud_amount.sum()),
+        }
+
+    def recent(self, n=None):
+        """
+        The buffered transactions as a DataFrame, newest first.
+        """
+        n = self.size if n is None else min(n, self.size)
+        slots = (self.position - 1 - np.arange(n)) % self.capacity
+        return pd.DataFrame({
+            "hour": self.hour[slots],
+            "fraud": self.fraud[slots],
+            "confidence": self.confidence[slots],
+            "amount": self.amount[slots],
+        })
@@ -1,82 +1,234 @@
-from langchain_groq import ChatGroq
-from langchain.prompts import PromptTemplate
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
-llm = ChatGroq(model="llama-3.1-8b-instant", api_key=os.getenv("GROQ_API_KEY"))
-
-# Prompt for regular explanations
-prompt_template = PromptTemplate(
-    input_variables=["transaction", "fraud_result", "patterns"],
-    template="""
-    **Role**: You are a senior fraud analyst at a major bank. Analyze this transaction.
-
-    **Chain-of-Thought Instructions**:
-    1. Start by identifying key transaction features (e.g., V2=3.5).
-    2. Compare against these fraud patterns (ordered by relevance):
-    {patterns}
-    3. Explain why patterns do/don't apply using banking regulations.
-    4. Qualify confidence using Basel III risk categories.
-
-    **Transaction**: {transaction}
-
-    **Model Prediction**: {fraud_result}
-
-    **Examples**:
-    - Good Analysis: "While V2 exceeds 3.0 (pattern: high-velocity fraud), the lack of corroborating evidence in V4/V17 suggests this might be a false positive."
-    - Bad Analysis: "It's fraud because the model said so."
-
-    **Your Analysis**:
-    """
-)
-
-# Prompt for borderline cases
-borderline_prompt_template = PromptTemplate(
-    input_variables=["transaction", "fraud_result", "patterns"],
-    template="""
-    **Role**: You are a senior fraud analyst at a major bank. This transaction is borderline, and the model is unsure. Analyze it carefully.
-
-    **Chain-of-Thought Instructions**:
-    1. Start by identifying key transaction features (e.g., V2=3.5).
-    2. Compare against these fraud patterns (ordered by relevance):
-    {patterns}
-    3. Explain why patterns do/don't apply using banking regulations.
-    4. Qualify confidence using Basel III risk categories.
-    5. Make a final judgment: Is this transaction fraudulent or legitimate?
-
-    **Transaction**: {transaction}
-
-    **Model Prediction**: {fraud_result}
-
-    **Examples**:
-    - Good Analysis: "While V2 exceeds 3.0 (pattern: high-velocity fraud), the lack of corroborating evidence in V4/V17 suggests this might be a false positive."
-    - Bad Analysis: "It's fraud because the model said so."
-
-    **Your Analysis**:
-    """
-)
-
-def process_transaction(transaction, fraud_result, patterns, is_borderline=False):
-    # Format patterns for the prompt
-    formatted_patterns = "\n".join([
-        f"- {p['feature']} {p['condition']}: {p['description']}"
-        for p in patterns
-    ])
-    
-    # Choose the appropriate prompt
-    if is_borderline:
-        prompt = borderline_prompt_template.format(
-            transaction=transaction,
-            fraud_result=fraud_result,
-            patterns=formatted_patterns
-        )
-    else:
-        prompt = prompt_template.format(
-            transaction=transaction,
-            fraud_result=fraud_result,
-            patterns=formatted_patterns
-        )
-    
-    # Invoke the LLM
-    return llm.invoke(prompt).content
\ No newline at end of file
+from explanation_cache import ExplanationCache
+from fraud_detector import format_drivers
+from pattern_retriever import rank_patterns
+import llm_scheduler
+import telemetry
+from startup import timed
+import asyncio
+import concurrent.futures
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+LLM_MODEL = "llama-3.1-8b-instant"
+
+# langchain, langchain_groq and dotenv are imported on first use, not at import time
+_llm = None
+_prompts = {}
+_lazy_lock = threading.Lock()
+
+def get_llm():
+    """
+    The shared ChatGroq client, created on first use.
+    """
+    global _llm
+    if _llm is None:
+        with _lazy_lock:
+            if _llm is None:
+                with timed("llm client"):
+                    from dotenv import load_dotenv
+                    from langchain_groq import ChatGroq
+
+                    load_dotenv()
+                    # Retries are left to the scheduler when it is in use
+                    _llm = ChatGroq(model=LLM_MODEL, api_key=os.getenv("GROQ_API_KEY"),
+                                    max_retries=0 if llm_scheduler.ENABLED else 2)
+    return _llm
+
+# Defaults for batched explanations; DEFAULT_TIMEOUT also bounds a single synchronous one
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_TIMEOUT = 30.0
+
+# Shared cache in front of every LLM call (memory LRU + SQLite)
+explanation_cache = ExplanationCache()
+
+# Prompt for regular explanations
+PROMPT_TEMPLATE = """
+    **Role**: You are a senior fraud analyst at a major bank. Analyze this transaction.
+
+    **Chain-of-Thought Instructions**:
+    1. Start by identifying key transaction features (e.g., V2=3.5). The model's strongest drivers were: {drivers}
+    2. Compare against these fraud patterns (ordered by relevance):
+    {patterns}
+    3. Explain why patterns do/don't apply using banking regulations.
+    4. Qualify confidence using Basel III risk categories.
+
+    **Transaction**: {transaction}
+
+    **Model Prediction**: {fraud_result}
+
+    **Examples**:
+    - Good Analysis: "While V2 exceeds 3.0 (pattern: high-velocity fraud), the lack of corroborating evidence in V4/V17 suggests this might be a false positive."
+    - Bad Analysis: "It's fraud because the model said so."
+
+    **Your Analysis**:
+    """
+
+# Prompt for borderline cases
+BORDERLINE_PROMPT_TEMPLATE = """
+    **Role**: You are a senior fraud analyst at a major bank. This transaction is borderline, and the model is unsure. Analyze it carefully.
+
+    **Chain-of-Thought Instructions**:
+    1. Start by identifying key transaction features (e.g., V2=3.5). The model's strongest drivers were: {drivers}
+    2. Compare against these fraud patterns (ordered by relevance):
+    {patterns}
+    3. Explain why patterns do/don't apply using banking regulations.
+    4. Qualify confidence using Basel III risk categories.
+    5. Make a final judgment: Is this transaction fraudulent or legitimate?
+
+    **Transaction**: {transaction}
+
+    **Model Prediction**: {fraud_result}
+
+    **Examples**:
+    - Good Analysis: "While V2 exceeds 3.0 (pattern: high-velocity fraud), the lack of corroborating evidence in V4/V17 suggests this might be a false positive."
+    - Bad Analysis: "It's fraud because the model said so."
+
+    **Your Analysis**:
+    """
+
+def _template(is_borderline):
+    # Choose the appropriate prompt
+    template = BORDERLINE_PROMPT_TEMPLATE if is_borderline else PROMPT_TEMPLATE
+    if template not in _prompts:
+        from langchain.prompts import PromptTemplate
+
+        _prompts[template] = PromptTemplate(
+            input_variables=["transaction", "fraud_result", "patterns", "drivers"],
+            template=template
+        )
+    return _prompts[template]
+
+def __getattr__(name):
+    # Keep the old module attributes working without loading langchain at import
+    if name == "llm":
+        return get_llm()
+    if name == "prompt_template":
+        return _template(False)
+    if name == "borderline_prompt_template":
+        return _template(True)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def build_prompt(transaction, fraud_result, patterns, is_borderline=False):
+    # Most relevant patterns first
+    with telemetry.stage("retrieval"):
+        patterns = rank_patterns(transaction, patterns)
+
+    # Format patterns for the prompt
+    formatted_patterns = "\n".join([
+        f"- {p['feature']} {p['condition']}: {p['description']}"
+        for p in patterns
+    ])
+    
+    # Drivers get their own line instead of being repeated in the result dict;
+    # the model version means nothing to the LLM
+    drivers = fraud_result.get("drivers") if isinstance(fraud_result, dict) else None
+    if isinstance(fraud_result, dict):
+        fraud_result = {key: value for key, value in fraud_result.items() if key not in ("drivers", "model_version")}
+
+    return _template(is_borderline).format(
+        transaction=transaction,
+        fraud_result=fraud_result,
+        patterns=formatted_patterns,
+        drivers=format_drivers(drivers) if drivers else "not available"
+    )
+
+def process_transaction(transaction, fraud_result, patterns, is_borderline=False, model=None,
+                        cache=explanation_cache, timeout=DEFAULT_TIMEOUT):
+    key, cached = _cached(cache, transaction, fraud_result, patterns, is_borderline)
+    if cached is not None:
+        return cached
+
+    with telemetry.stage("prompt"):
+        prompt = build_prompt(transaction, fraud_result, patterns, is_borderline)
+    
+    # Invoke the LLM; an injected model goes through the scheduler too
+    telemetry.count("llm_calls")
+    if llm_scheduler.ENABLED:
+        future = llm_scheduler.get_scheduler().submit(prompt, llm_scheduler.request_priority(fraud_result),
+                                                      model=model)
+        try:
+            # Bounded like the batched async path, so a stalled queue can't hang the caller
+            content = future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            # Dropped from the queue unless a worker has already taken it
+            future.cancel()
+            raise
+    else:
+        with telemetry.stage("llm"):
+            content = (model or get_llm()).invoke(prompt).content
+    if key is not None:
+        cache.set(key, content)
+    return content
+
+async def aprocess_transaction(transaction, fraud_result, patterns, is_borderline=False, model=None,
+                               cache=explanation_cache):
+    # The cache may read SQLite, so it is used from a worker thread, off the event loop
+    key, cached = await asyncio.to_thread(_cached, cache, transaction, fraud_result, patterns, is_borderline)
+    if cached is not None:
+        return cached
+
+    with telemetry.stage("prompt"):
+        # Ranking the patterns embeds the transaction, so this runs off the event loop too
+        prompt = await asyncio.to_thread(build_prompt, transaction, fraud_result, patterns, is_borderline)
+    telemetry.count("llm_calls")
+    if llm_scheduler.ENABLED:
+        content = await llm_scheduler.get_scheduler().asubmit(prompt, llm_scheduler.request_priority(fraud_result),
+                                                              model=model)
+    else:
+        with telemetry.stage("llm"):
+            content = (await (model or get_llm()).ainvoke(prompt)).content
+    if key is not None:
+        await asyncio.to_thread(cache.set, key, content)
+    return content
+
+def _cache_key(cache, transaction, fraud_result, patterns, is_borderline):
+    if cache is None:
+        return None
+    template = BORDERLINE_PROMPT_TEMPLATE if is_borderline else PROMPT_TEMPLATE
+    return cache.key(template, transaction, fraud_result, patterns)
+
+def _cached(cache, transaction, fraud_result, patterns, is_borderline):
+    # (cache key, cached explanation or None)
+    if cache is None:
+        return None, None
+    with telemetry.stage("llm_cache"):
+        key = _cache_key(cache, transaction, fraud_result, patterns, is_borderline)
+        cached = cache.get(key)
+    telemetry.count("llm_cache_hits" if cached is not None else "llm_cache_misses")
+    return key, cached
+
+async def aprocess_transactions(items, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                                timeout=DEFAULT_TIMEOUT, model=None, cache=explanation_cache):
+    """
+    Explain many transactions with overlapping LLM calls.
+
+    `items` is a list of dicts with the keyword arguments of process_transaction
+    (transaction, fraud_result, patterns and optionally is_borderline). At most
+    `max_concurrency` calls are in flight, each limited to `timeout` seconds.
+    Explanations are returned in the order of `items`; a call that fails or
+    times out yields an "Error: ..." string instead of aborting the batch.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def explain(item):
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(aprocess_transaction(**item, model=model, cache=cache), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"LLM explanation timed out after {timeout}s")
+                return f"Error: LLM explanation timed out after {timeout}s"
+            except Exception as e:
+                logger.error(f"Error generating LLM explanation: {e}")
+                return f"Error: {e}"
+
+    return await asyncio.gather(*(explain(item) for item in items))
+
+def process_transactions(items, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                         timeout=DEFAULT_TIMEOUT, model=None, cache=explanation_cache):
+    """
+    Synchronous wrapper around aprocess_transactions.
+    """
+    return asyncio.run(aprocess_transactions(items, max_concurrency, timeout, model, cache))
\ No newline at end of file
@@ -0,0 +1,416 @@
+"""
+Priority scheduler in front of the LLM: rate limiting, retries and backpressure.
+
+Prompts are queued by priority (confirmed fraud first, then borderline
+cases, then the rest by fraud probability) and sent by a few workers on a
+dedicated event loop thread. Each send waits for two token buckets, one
+for requests and one for estimated tokens per minute. Rate limits (429),
+server errors and timeouts are retried with exponential backoff and full
+jitter, honouring Retry-After. The queue has a fixed depth; submit blocks
+or raises SchedulerBusy when it is full.
+
+Environment:
+    LLM_SCHEDULER=0                  call the LLM directly instead
+    LLM_REQUESTS_PER_MINUTE=30
+    LLM_TOKENS_PER_MINUTE=6000
+    LLM_MAX_QUEUE_DEPTH=1000
+    LLM_CONCURRENCY=4
+
+Usage (load test against a stub server, see benchmarks/llm_stub_server.py):
+    python llm_scheduler.py --base-url http://127.0.0.1:9000 --requests 50
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("LLM_SCHEDULER", "1") != "0"
+
+# Groq's published limits for llama-3.1-8b-instant on the free tier
+DEFAULT_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", 30))
+DEFAULT_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", 6000))
+DEFAULT_MAX_QUEUE_DEPTH = int(os.getenv("LLM_MAX_QUEUE_DEPTH", 1000))
+DEFAULT_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 4))
+
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 30.0
+DEFAULT_TIMEOUT = 30.0
+# How long a blocking submit waits for room in the queue
+DEFAULT_ENQUEUE_TIMEOUT = 30.0
+
+# Token estimate: ~4 characters per prompt token plus the expected answer
+CHARS_PER_TOKEN = 4
+EXPECTED_COMPLETION_TOKENS = 400
+
+RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+# Priority classes, lower is served first
+PRIORITY_FRAUD = 0
+PRIORITY_BORDERLINE = 1
+PRIORITY_OTHER = 2
+
+
+class SchedulerBusy(Exception):
+    """
+    The LLM queue is full; retry later.
+    """
+
+
+def request_priority(fraud_result):
+    """
+    Sort key for a detector result: fraud, then borderline, then the rest,
+    higher fraud probability first within each class.
+    """
+    if fraud_result is None:
+        return (PRIORITY_OTHER, 0.0)
+    if fraud_result.get("fraud"):
+        priority = PRIORITY_FRAUD
+    elif fraud_result.get("is_borderline"):
+        priority = PRIORITY_BORDERLINE
+    else:
+        priority = PRIORITY_OTHER
+    return (priority, -float(fraud_result.get("confidence", 0.0)))
+
+
+def estimate_tokens(prompt):
+    return len(str(prompt)) // CHARS_PER_TOKEN + EXPECTED_COMPLETION_TOKENS
+
+
+def status_code(error):
+    code = getattr(error, "status_code", None)
+    if code is None:
+        code = getattr(getattr(error, "response", None), "status_code", None)
+    return code
+
+
+def retry_after(error):
+    """
+    Seconds from a Retry-After header on the error's response, if any.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in ("APIConnectionError", "APITimeoutError"):
+        return True
+    return status_code(error) in RETRY_STATUS_CODES
+
+
+class TokenBucket:
+    """
+    `rate_per_minute` tokens refill continuously up to `capacity` (by
+    default one minute's worth).
+    """
+
+    def __init__(self, rate_per_minute, capacity=None, clock=time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """
+        Seconds until `amount` tokens are available (0 if they are now).
+        """
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+
+class LLMScheduler:
+    """
+    Runs LLM calls for any thread or event loop. submit() returns a
+    concurrent.futures.Future with the response content.
+    """
+
+    def __init__(self, model=None, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE, max_queue_depth=DEFAULT_MAX_QUEUE_DEPTH,
+                 concurrency=DEFAULT_CONCURRENCY, max_retries=DEFAULT_MAX_RETRIES,
+                 base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY, timeout=DEFAULT_TIMEOUT):
+        self.model = model
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_queue_depth = max_queue_depth
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+
+        self._heap = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        # Serializes start() and stop(); separate from _lock, which the workers take
+        self._start_lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._wakeup = None
+        self._workers = []
+
+        self.counters = {
+            "submitted": 0, "completed": 0, "failed": 0, "rejected": 0,
+            "retries": 0, "rate_limited": 0, "cancelled": 0,
+        }
+
+    def start(self):
+        # _thread is only published once the loop runs, so no caller gets past
+        # here while _loop and _wakeup are still unset
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            ready = threading.Event()
+            thread = threading.Thread(target=self._run_loop, args=(ready,), name="llm-scheduler", daemon=True)
+            thread.start()
+            ready.wait()
+            self._thread = thread
+
+    def _run_loop(self, ready):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._wakeup = asyncio.Event()
+        self._workers = [self._loop.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._loop.call_soon(ready.set)
+        self._loop.run_forever()
+
+    def stop(self):
+        """
+        Stop the workers and fail whatever is still queued.
+        """
+        with self._start_lock:
+            if self._thread is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._cancel_workers(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._thread = None
+        with self._lock:
+            pending, self._heap = self._heap, []
+            self._not_full.notify_all()
+        for _, _, _, future in pending:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError("LLM scheduler stopped"))
+
+    async def _cancel_workers(self):
+        # In-flight calls fail their futures as they are cancelled
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    def submit(self, prompt, priority=(PRIORITY_OTHER, 0.0), model=None, block=True,
+               timeout=DEFAULT_ENQUEUE_TIMEOUT):
+        """
+        Queue a prompt. With block=True wait up to `timeout` seconds for room
+        in a full queue; raise SchedulerBusy if there is none.
+        """
+        self.start()
+        future = concurrent.futures.Future()
+        with self._not_full:
+            if len(self._heap) >= self.max_queue_depth:
+                if not block or not self._not_full.wait_for(
+                        lambda: len(self._heap) < self.max_queue_depth, timeout):
+                    self.counters["rejected"] += 1
+                    telemetry.count("errors", stage="llm_queue_full")
+                    raise SchedulerBusy(f"LLM queue is full ({self.max_queue_depth} requests)")
+            heapq.heappush(self._heap, (priority, next(self._sequence), (prompt, model), future))
+            self.counters["submitted"] += 1
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+        return future
+
+    async def asubmit(self, prompt, priority=(PRIORITY_OTHER, 0.0), model=None):
+        """
+        submit() for coroutines: never blocks the caller's loop, raises
+        SchedulerBusy at once when the queue is full.
+        """
+        return await asyncio.wrap_future(self.submit(prompt, priority, model, block=False))
+
+    def _pop(self):
+        with self._not_full:
+            if not self._heap:
+                return None
+            item = heapq.heappop(self._heap)
+            self._not_full.notify()
+            return item
+
+    async def _next(self):
+        while True:
+            item = self._pop()
+            if item is not None:
+                return item
+            self._wakeup.clear()
+            item = self._pop()
+            if item is not None:
+                return item
+            await self._wakeup.wait()
+
+    async def _acquire(self, tokens):
+        while True:
+            delay = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+            if delay <= 0:
+                self.requests.take(1)
+                self.tokens.take(tokens)
+                return
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt, error):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        server_delay = retry_after(error)
+        return max(delay, server_delay) if server_delay is not None else delay
+
+    async def _call(self, prompt, model):
+        tokens = estimate_tokens(prompt)
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(tokens)
+            try:
+                with telemetry.stage("llm"):
+                    response = await asyncio.wait_for((model or self._model()).ainvoke(prompt), self.timeout)
+                return response.content
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                if status_code(e) == 429:
+                    self.counters["rate_limited"] += 1
+                self.counters["retries"] += 1
+                delay = self._backoff(attempt, e)
+                logger.warning(f"LLM call failed ({e.__class__.__name__}), retry {attempt + 1} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    def _model(self):
+        if self.model is None:
+            from llm_chain import get_llm
+
+            self.model = get_llm()
+        return self.model
+
+    async def _worker(self):
+        while True:
+            _, _, (prompt, model), future = await self._next()
+            if not future.set_running_or_notify_cancel():
+                self.counters["cancelled"] += 1
+                continue
+            try:
+                content = await self._call(prompt, model)
+            except asyncio.CancelledError:
+                future.set_exception(RuntimeError("LLM scheduler stopped"))
+                raise
+            except Exception as e:
+                self.counters["failed"] += 1
+                future.set_exception(e)
+            else:
+                self.counters["completed"] += 1
+                future.set_result(content)
+
+    def metrics(self):
+        with self._lock:
+            depth = len(self._heap)
+        return {
+            "queue_depth": depth,
+            "max_queue_depth": self.max_queue_depth,
+            **self.counters,
+        }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """
+    The process-wide scheduler for the shared LLM client, started on first use.
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler()
+    return _scheduler
+
+
+def set_scheduler(scheduler):
+    """
+    Replace the process-wide scheduler (e.g. with one under other limits)
+    and return the previous one, which is left running.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        previous, _scheduler = _scheduler, scheduler
+    return previous
+
+
+def shutdown():
+    """
+    Stop the process-wide scheduler, if one was created. The next
+    get_scheduler() starts a new one.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        scheduler, _scheduler = _scheduler, None
+    if scheduler is not None:
+        scheduler.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", required=True, help="Groq-compatible API base URL (e.g. a stub server)")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--rpm", type=float, default=DEFAULT_REQUESTS_PER_MINUTE)
+    parser.add_argument("--tpm", type=float, default=DEFAULT_TOKENS_PER_MINUTE)
+    parser.add_argument("--queue", type=int, default=DEFAULT_MAX_QUEUE_DEPTH)
+    args = parser.parse_args()
+
+    from langchain_groq import ChatGroq
+    from llm_chain import LLM_MODEL
+
+    model = ChatGroq(model=LLM_MODEL, api_key="stub", base_url=args.base_url, max_retries=0)
+    scheduler = LLMScheduler(model, args.rpm, args.tpm, args.queue, base_delay=0.1, max_delay=2.0)
+
+    start = time.perf_counter()
+    rng = random.Random(0)
+    futures = []
+    for i in range(args.requests):
+        confidence = rng.random()
+        result = {"fraud": confidence >= 0.7, "is_borderline": 0.3 <= confidence <= 0.7, "confidence": confidence}
+        try:
+            futures.append((request_priority(result), scheduler.submit(f"Explain transaction {i}",
+                                                                       request_priority(result), block=False)))
+        except SchedulerBusy:
+            pass
+
+    for _, future in futures:
+        try:
+            future.result()
+        except Exception as e:
+            logger.error(f"Request failed: {e}")
+    scheduler.stop()
+    print({**scheduler.metrics(), "seconds": round(time.perf_counter() - start, 2)})
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,124 @@
+from collections import deque
+import asyncio
+import logging
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Defaults for request coalescing
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_WAIT = 0.002  # seconds
+DEFAULT_METRICS_WINDOW = 10000  # recent batches / requests kept for percentiles
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-transaction requests into one vectorized
+    FraudDetector.score_many call.
+
+    A batch is flushed when it reaches `max_batch_size` or when `max_wait`
+    seconds have passed since its first request. While a batch is being
+    scored the next one keeps filling up, so batches grow with load.
+    `get_detector` is called once per batch, so batches follow hot reloads
+    (see model_registry.py).
+    """
+
+    def __init__(self, get_detector, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait=DEFAULT_MAX_WAIT,
+                 metrics_window=DEFAULT_METRICS_WINDOW):
+        self.get_detector = get_detector
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self.queue = None
+        self._worker = None
+
+        self.requests = 0
+        self.batches = 0
+        self.batch_sizes = deque(maxlen=metrics_window)
+        self.queue_waits = deque(maxlen=metrics_window)
+
+    async def start(self):
+        if self._worker is None:
+            self.queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+            # Fail whatever was still waiting for a flush
+            while not self.queue.empty():
+                _, future, _ = self.queue.get_nowait()
+                if not future.done():
+                    future.set_exception(RuntimeError("MicroBatcher stopped"))
+
+    async def submit(self, transaction):
+        """
+        Score one transaction; resolves to the same (result, patterns) pair
+        as FraudDetector.score.
+        """
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((transaction, future, time.perf_counter()))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        now = time.perf_counter()
+        self.requests += len(batch)
+        self.batches += 1
+        self.batch_sizes.append(len(batch))
+        self.queue_waits.extend(now - enqueued for _, _, enqueued in batch)
+
+        transactions = [transaction for transaction, _, _ in batch]
+        try:
+            # Scored in a worker thread so the event loop keeps accepting requests
+            results = await asyncio.get_running_loop().run_in_executor(
+                None, self.get_detector().score_many, transactions
+            )
+        except Exception as e:
+            logger.error(f"Error scoring micro-batch of {len(batch)}: {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def metrics(self):
+        sizes = np.asarray(self.batch_sizes, dtype=np.float64)
+        waits = np.asarray(self.queue_waits, dtype=np.float64) * 1000
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batch_size_mean": float(sizes.mean()) if sizes.size else 0.0,
+            "batch_size_max": int(sizes.max()) if sizes.size else 0,
+            "queue_wait_ms_p50": float(np.percentile(waits, 50)) if waits.size else 0.0,
+            "queue_wait_ms_p95": float(np.percentile(waits, 95)) if waits.size else 0.0,
+            "queue_wait_ms_p99": float(np.percentile(waits, 99)) if waits.size else 0.0,
+        }
@@ -0,0 +1,251 @@
+"""
+Zero-downtime reload of the model, scaler and patterns.
+
+The registry owns the process's current FraudDetector. When the artifacts in
+models/ change (checked by a background thread) or on POST /admin/reload, a
+new detector is loaded, warmed up and validated beside the current one, then
+swapped in with a single reference assignment. Callers take the current
+detector once per request (get_detector), so requests already running finish
+on the version they started with, and every result carries the
+`model_version` it was scored with.
+
+A candidate is rejected, and the current version kept, when it fails to
+load, its feature names differ from the running ones (the API schema is
+fixed at startup), the cascade pre-filter on disk was fitted for another
+booster, it gives non-finite or out-of-range probabilities on a smoke
+batch, or the exported booster disagrees with the pickled model (checked
+only when the pickles are on disk).
+
+Replace artifacts by writing them elsewhere and renaming them into models/.
+A change is picked up once the files have stopped changing for one check.
+
+Environment:
+    MODEL_RELOAD_INTERVAL=5   seconds between checks of models/ (0 turns watching off)
+"""
+import logging
+import os
+import threading
+import time
+import numpy as np
+
+import cascade
+from fraud_detector import FraudDetector, METADATA_PATH, PATTERNS_PATH
+from native_engine import (check_parity, export_native, native_stale,
+                           MODEL_PATH, SCALER_PATH, NATIVE_MODEL_PATH, NATIVE_SCALER_PATH)
+from startup import timed
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+# A change to any of these triggers a reload
+WATCHED_PATHS = (MODEL_PATH, SCALER_PATH, NATIVE_MODEL_PATH, NATIVE_SCALER_PATH,
+                 METADATA_PATH, PATTERNS_PATH, cascade.CASCADE_PATH)
+
+DEFAULT_CHECK_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", 5))
+
+# Random rows a candidate scores before it is swapped in
+SMOKE_ROWS = 1000
+
+# Largest native vs pickled probability difference a candidate may show
+PARITY_TOLERANCE = 1e-6
+
+# Process-wide registry behind fraud_detector.get_detector
+_shared_registry = None
+_shared_registry_lock = threading.Lock()
+
+
+def file_fingerprint(paths):
+    """
+    (path, mtime, size) of each path, None for missing ones.
+    """
+    fingerprint = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            fingerprint.append((path, None))
+        else:
+            fingerprint.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(fingerprint)
+
+
+class ReloadError(Exception):
+    """
+    A candidate model was rejected; the current one keeps serving.
+    """
+
+
+def get_registry():
+    """
+    The process-wide ModelRegistry, loading the first detector on first use.
+    """
+    global _shared_registry
+    if _shared_registry is None:
+        with _shared_registry_lock:
+            if _shared_registry is None:
+                _shared_registry = ModelRegistry()
+    return _shared_registry
+
+
+class ModelRegistry:
+    def __init__(self, loader=FraudDetector, check_interval=DEFAULT_CHECK_INTERVAL, watched_paths=WATCHED_PATHS):
+        self.loader = loader
+        self.check_interval = check_interval
+        self.watched_paths = tuple(watched_paths)
+        # One reload at a time; scoring never takes this lock
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+
+        self.reloads = 0
+        self.failures = 0
+        self.last_reload = None
+        with timed("detector load"):
+            self._files = file_fingerprint(self.watched_paths)
+            self._current = loader()
+        self.loaded_at = time.time()
+
+    @property
+    def current(self):
+        return self._current
+
+    @property
+    def version(self):
+        return self._current.model_version
+
+    def reload(self, force=False):
+        """
+        Load, warm up and validate the artifacts on disk, and swap them in
+        if they pass. Unless `force`, nothing happens when the watched files
+        are unchanged or hold the running version. Returns a report; raises
+        ReloadError when the candidate is rejected.
+        """
+        with self._reload_lock:
+            start = time.perf_counter()
+            files = None
+            try:
+                if native_stale():
+                    # Export new pickles first, so the export doesn't count as a change mid-load
+                    export_native()
+                files = file_fingerprint(self.watched_paths)
+                if not force and files == self._files:
+                    return {"reloaded": False, "version": self.version}
+                candidate = self.loader()
+                report = self.validate(candidate)
+                candidate.warm_up()
+            except Exception as e:
+                # Not retried until the files change again
+                self._files = files or file_fingerprint(self.watched_paths)
+                self.failures += 1
+                telemetry.count("model_reloads", outcome="rejected")
+                self.last_reload = {"reloaded": False, "error": str(e), "at": time.time()}
+                logger.error(f"Model reload rejected, keeping {self.version}: {e}")
+                if isinstance(e, ReloadError):
+                    raise
+                raise ReloadError(str(e)) from e
+
+            if file_fingerprint(self.watched_paths) != files:
+                # Left unrecorded so the next check loads the files once they settle
+                logger.info("Model files changed while loading, retrying on the next check")
+                return {"reloaded": False, "version": self.version}
+            self._files = files
+            if not force and candidate.model_version == self.version:
+                return {"reloaded": False, "version": self.version}
+
+            previous = self.version
+            # The swap: requests that already hold the previous detector finish on it
+            self._current = candidate
+            self.loaded_at = time.time()
+            self.reloads += 1
+            telemetry.count("model_reloads", outcome="swapped")
+            report.update({
+                "reloaded": True,
+                "version": candidate.model_version,
+                "previous_version": previous,
+                "load_s": round(time.perf_counter() - start, 3),
+                "at": self.loaded_at,
+            })
+            self.last_reload = report
+            logger.info(f"Swapped model {previous} -> {candidate.model_version} in {report['load_s']}s")
+            return report
+
+    def validate(self, candidate):
+        """
+        Smoke and parity checks of a candidate before it serves traffic.
+        Returns a report; raises ReloadError on failure.
+        """
+        current = self._current
+        feature_names = candidate.metadata['feature_names']
+        if feature_names != current.metadata['feature_names']:
+            raise ReloadError("Feature names differ from the running model; a restart is needed to change them")
+        if candidate.cascade_stale:
+            raise ReloadError("The cascade pre-filter was fitted for another model; refit it with cascade.py fit")
+
+        rng = np.random.default_rng(0)
+        values = rng.normal(scale=5, size=(SMOKE_ROWS, len(feature_names))).astype(np.float32)
+        probs = candidate.engine.predict_proba(values)
+        if not (np.isfinite(probs).all() and (probs >= 0).all() and (probs <= 1).all()):
+            raise ReloadError("Smoke batch gave probabilities outside [0, 1]")
+
+        # A native-only deploy has no pickles to compare against, as in native_stale()
+        parity_checked = os.path.exists(MODEL_PATH) and os.path.exists(SCALER_PATH)
+        if parity_checked:
+            try:
+                parity = check_parity(candidate, rows=SMOKE_ROWS, tolerance=PARITY_TOLERANCE)
+            finally:
+                # The pickled model is only needed for the check
+                candidate._model = None
+            if not parity:
+                raise ReloadError("Native model disagrees with the pickled model")
+        else:
+            logger.info("No pickled model on disk, skipping the native parity check")
+
+        changed = candidate.verdicts(probs)["fraud"] != current.verdicts(current.engine.predict_proba(values))["fraud"]
+        return {"smoke_rows": SMOKE_ROWS, "parity_checked": parity_checked, "verdict_changes": int(changed.sum())}
+
+    def start(self):
+        """
+        Watch the artifacts from a background thread. Does nothing when the
+        check interval is 0 or the watcher is already running.
+        """
+        if self.check_interval <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="model-registry", daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch(self):
+        pending = None
+        while not self._stop.wait(self.check_interval):
+            files = file_fingerprint(self.watched_paths)
+            if files == self._files:
+                pending = None
+            elif files != pending:
+                # Changed since the last check: wait for the copy to finish
+                pending = files
+            else:
+                pending = None
+                try:
+                    self.reload()
+                except ReloadError:
+                    pass
+                except Exception as e:
+                    logger.error(f"Model reload failed: {e}")
+
+    def status(self):
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "reloading": self._reload_lock.locked(),
+            "watching": self._watcher is not None and self._watcher.is_alive(),
+            "check_interval": self.check_interval,
+            "last_reload": self.last_reload,
+        }
@@ -0,0 +1,163 @@
+import re
+import numpy as np
+
+# Comparison operators understood in the 'condition' column
+OPERATORS = {
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "==": np.equal,
+}
+
+# Operator to use when the operands of a clause are swapped (5.0 < Value -> Value > 5.0)
+FLIPPED = {"<": ">", "<=": ">=", ">": "<", ">=": "<=", "==": "=="}
+
+_OPERATOR_SPLIT = re.compile(r"(<=|>=|==|<|>)")
+_CONJUNCTION_SPLIT = re.compile(r"\band\b|&", flags=re.IGNORECASE)
+
+
+def parse_condition(feature, condition):
+    """
+    Parse a condition string into a list of (feature, operator, threshold) clauses
+    that must all hold. 'Value' refers to the pattern's own feature; other
+    feature names may be used for compound rules.
+
+    Supported forms:
+        Value < -8.0
+        Value >= 5.0
+        -5.0 < Value <= 3.0
+        Value < -8.0 and V14 < -10.0
+    """
+    clauses = []
+    for part in _CONJUNCTION_SPLIT.split(condition):
+        tokens = [token.strip() for token in _OPERATOR_SPLIT.split(part)]
+        if len(tokens) < 3 or len(tokens) % 2 == 0:
+            raise ValueError(f"Cannot parse condition '{condition}' for feature {feature}")
+
+        # Chained comparisons (a < Value < b) yield one clause per operator
+        for i in range(1, len(tokens), 2):
+            left, op, right = tokens[i - 1], tokens[i], tokens[i + 1]
+            left_value, right_value = _as_number(left), _as_number(right)
+
+            if left_value is None and right_value is not None:
+                clauses.append((_resolve(left, feature), op, right_value))
+            elif left_value is not None and right_value is None:
+                clauses.append((_resolve(right, feature), FLIPPED[op], left_value))
+            else:
+                raise ValueError(f"Cannot parse condition '{condition}' for feature {feature}")
+
+    return clauses
+
+
+def _as_number(token):
+    try:
+        return float(token)
+    except ValueError:
+        return None
+
+
+def _resolve(name, feature):
+    return feature if name == "Value" else name
+
+
+class PatternMatcher:
+    """
+    Fraud patterns compiled once into flat clause arrays so that they can be
+    evaluated over a whole batch of transactions with a handful of NumPy ops.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = patterns.reset_index(drop=True)
+        self.records = self.patterns.to_dict("records")
+
+        clause_rules = []
+        clause_features = []
+        clause_ops = []
+        clause_thresholds = []
+        for rule, (feature, condition) in enumerate(zip(self.patterns["feature"], self.patterns["condition"])):
+            for clause_feature, op, threshold in parse_condition(feature, condition):
+                clause_rules.append(rule)
+                clause_features.append(clause_feature)
+                clause_ops.append(op)
+                clause_thresholds.append(threshold)
+
+        # Every feature referenced by any clause, in first-seen order
+        self.features = list(dict.fromkeys(clause_features))
+        column_index = {feature: i for i, feature in enumerate(self.features)}
+
+        self.clause_rules = np.asarray(clause_rules, dtype=np.intp)
+        self.clause_columns = np.asarray([column_index[f] for f in clause_features], dtype=np.intp)
+        self.clause_thresholds = np.asarray(clause_thresholds, dtype=np.float64)
+        # Clause positions grouped by operator, evaluated in one comparison each
+        ops = np.asarray(clause_ops, dtype=object)
+        self.op_groups = [
+            (OPERATORS[op], np.flatnonzero(ops == op))
+            for op in OPERATORS
+            if (ops == op).any()
+        ]
+        # Clauses are emitted rule by rule, so each rule is a contiguous slice
+        self.rule_starts = np.searchsorted(self.clause_rules, np.arange(len(self.records)))
+
+    def __len__(self):
+        return len(self.records)
+
+    def feature_matrix(self, data):
+        """
+        Build the (n_rows, n_features) float matrix the clauses index into.
+        Accepts a DataFrame or a single transaction dict; missing features are
+        NaN and therefore never match.
+        """
+        if isinstance(data, dict):
+            return np.array([[data.get(f, np.nan) for f in self.features]], dtype=np.float64)
+        return data.reindex(columns=self.features).to_numpy(dtype=np.float64, na_value=np.nan)
+
+    def array_matrix(self, values, columns):
+        """
+        Same as feature_matrix, for a 2-D array whose columns are named by
+        `columns` (None marks a column that is absent from the input).
+        """
+        index = {name: i for i, name in enumerate(columns) if name is not None}
+        matrix = np.full((len(values), len(self.features)), np.nan, dtype=np.float64)
+        for k, feature in enumerate(self.features):
+            if feature in index:
+                matrix[:, k] = values[:, index[feature]]
+        return matrix
+
+    def match_matrix(self, data):
+        """
+        Boolean (n_rows, n_patterns) matrix: True where the row satisfies every
+        clause of the pattern.
+        """
+        return self.evaluate(self.feature_matrix(data))
+
+    def evaluate(self, values):
+        """
+        match_matrix for a matrix already built by feature_matrix or array_matrix.
+        """
+        if not self.records:
+            return np.zeros((len(values), 0), dtype=bool)
+
+        operands = values[:, self.clause_columns]
+        clause_hits = np.empty(operands.shape, dtype=bool)
+        with np.errstate(invalid="ignore"):
+            for compare, positions in self.op_groups:
+                clause_hits[:, positions] = compare(operands[:, positions], self.clause_thresholds[positions])
+
+        return np.logical_and.reduceat(clause_hits, self.rule_starts, axis=1)
+
+    def matches(self, data):
+        """
+        Sparse form of match_matrix: one list of pattern indices per row.
+        """
+        rows, rules = np.nonzero(self.match_matrix(data))
+        per_row = [[] for _ in range(len(data) if not isinstance(data, dict) else 1)]
+        for row, rule in zip(rows.tolist(), rules.tolist()):
+            per_row[row].append(rule)
+        return per_row
+
+    def match_records(self, data):
+        """
+        Matching pattern rows as dicts, one list per transaction.
+        """
+        return [[self.records[rule] for rule in rules] for rules in self.matches(data)]
@@ -0,0 +1,229 @@
+"""
+Semantic retrieval over the persisted fraud pattern index.
+
+The embeddings written by fraud_pattern_index.py are memory-mapped from its
+binary index as one contiguous, L2-normalized float32 matrix, so a query is
+one matrix-vector product plus a top-k partition; llama_index is not
+imported at runtime. Transactions are turned into a short description of
+their notable features ("Extremely low V14 values ..."), whose embedding
+is cached.
+"""
+from collections import OrderedDict
+import json
+import logging
+import os
+import threading
+import numpy as np
+from fraud_pattern_index import INDEX_DIR, EMBED_MODEL, PATTERN_FIELDS, LLAMA_VECTOR_STORE_FILE, load_vectors, normalize
+from startup import timed
+
+logger = logging.getLogger(__name__)
+
+# Query embeddings kept in memory (descriptions repeat a lot, so this stays small)
+DEFAULT_CACHE_SIZE = 4096
+
+# A V-feature enters the description when |value| reaches this, strongest first
+DESCRIBE_MIN_ABS = 2.0
+DESCRIBE_MAX_FEATURES = 5
+# |value| from which a feature is "Extremely" low/high
+EXTREME_ABS = 8.0
+
+
+def load_index(index_dir=INDEX_DIR):
+    """
+    (matrix, records) from a persisted index: one normalized float32 row per
+    pattern and the pattern's fields, in the same order. The binary index is
+    memory-mapped; an index only in llama_index JSON is parsed instead.
+    """
+    binary = load_vectors(index_dir)
+    if binary is not None:
+        matrix, entries = binary
+        return matrix, [{field: entry[field] for field in PATTERN_FIELDS} for entry in entries]
+
+    with open(os.path.join(index_dir, LLAMA_VECTOR_STORE_FILE), "r") as f:
+        store = json.load(f)
+
+    ids = list(store["embedding_dict"])
+    matrix = np.array([store["embedding_dict"][i] for i in ids], dtype=np.float32)
+    records = [{field: store["metadata_dict"][i].get(field) for field in PATTERN_FIELDS} for i in ids]
+    return normalize(matrix), records
+
+
+def pattern_key(pattern):
+    return (pattern["feature"], pattern["condition"])
+
+
+def describe(transaction):
+    """
+    Short text for a transaction's strongest V-feature deviations, in the
+    wording of the pattern descriptions. Values are bucketed into words, so
+    similar transactions share a description (and a cached embedding).
+    """
+    notable = sorted(
+        (
+            (key, value) for key, value in transaction.items()
+            if key.startswith("V") and isinstance(value, (int, float)) and abs(value) >= DESCRIBE_MIN_ABS
+        ),
+        key=lambda item: -abs(item[1])
+    )[:DESCRIBE_MAX_FEATURES]
+
+    parts = []
+    for feature, value in notable:
+        level = "low" if value < 0 else "high"
+        if abs(value) >= EXTREME_ABS:
+            level = f"extremely {level}"
+        parts.append(f"{level.capitalize()} {feature} values")
+    return "; ".join(parts) or "Transaction with typical feature values"
+
+
+class PatternRetriever:
+    """
+    Top-k cosine search of transaction descriptions against the pattern
+    embeddings. `embed` maps a text to a vector; by default the index's own
+    sentence-transformers model is loaded on first use.
+    """
+
+    def __init__(self, index_dir=INDEX_DIR, embed=None, cache_size=DEFAULT_CACHE_SIZE):
+        self.matrix, self.records = load_index(index_dir)
+        self.positions = {pattern_key(record): i for i, record in enumerate(self.records)}
+        self._embed = embed
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        # Held while the embedding model loads; cache hits don't wait for it
+        self._load_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def embed(self, text):
+        """
+        Normalized query embedding of `text`, cached.
+        """
+        with self._lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+                self.hits += 1
+                return vector
+            self.misses += 1
+
+        vector = np.ascontiguousarray(normalize(self.load_embedder()(text)))
+
+        with self._lock:
+            self._cache[text] = vector
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return vector
+
+    def load_embedder(self):
+        """
+        The query embedding function, loading the model if needed.
+        """
+        if self._embed is None:
+            with self._load_lock:
+                if self._embed is None:
+                    from langchain_huggingface import HuggingFaceEmbeddings
+
+                    with timed("embedding model load"):
+                        self._embed = HuggingFaceEmbeddings(model_name=EMBED_MODEL).embed_query
+        return self._embed
+
+    def scores(self, transaction):
+        """
+        Cosine similarity of the transaction's description to every pattern.
+        """
+        return self.matrix @ self.embed(describe(transaction))
+
+    def search(self, transaction, k=5):
+        """
+        The k most relevant patterns as (score, pattern) pairs, best first.
+        """
+        scores = self.scores(transaction)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), self.records[i]) for i in top]
+
+    def rank(self, transaction, patterns):
+        """
+        `patterns` reordered by relevance to the transaction. Patterns that are
+        not in the index keep their order, after the indexed ones.
+        """
+        if len(patterns) < 2:
+            return list(patterns)
+        rows = [self.positions.get(pattern_key(p), -1) for p in patterns]
+        # Only the rows of the given patterns are scored, not the whole matrix
+        known = np.array([row for row in rows if row >= 0], dtype=np.intp)
+        scores = dict(zip(known.tolist(), (self.matrix[known] @ self.embed(describe(transaction))).tolist()))
+        # Stable sort: unknown patterns score -inf and stay in input order
+        order = sorted(range(len(patterns)), key=lambda i: -scores.get(rows[i], -np.inf))
+        return [patterns[i] for i in order]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "patterns": len(self.records),
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cache_hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+_retriever = None
+_retriever_lock = threading.Lock()
+_retriever_failed = False
+
+
+def get_retriever():
+    """
+    The process-wide PatternRetriever, or None when the index is missing.
+    """
+    global _retriever, _retriever_failed
+    if _retriever is None and not _retriever_failed:
+        with _retriever_lock:
+            if _retriever is None and not _retriever_failed:
+                try:
+                    with timed("retriever load"):
+                        _retriever = PatternRetriever()
+                except (OSError, ValueError, KeyError) as e:
+                    logger.warning(f"Pattern index unavailable, patterns stay unranked: {e}")
+                    _retriever_failed = True
+    return _retriever
+
+
+def _disable(error):
+    # Ranking is optional: a missing package or an embedder that can't load
+    # (e.g. no network to fetch the model) must not fail the explanation.
+    # Logged once; later calls don't retry the load
+    global _retriever, _retriever_failed
+    logger.warning(f"Pattern ranking unavailable, patterns stay unranked: {error}")
+    _retriever, _retriever_failed = None, True
+
+
+def load_embedder():
+    """
+    Load the embedding model ahead of the first ranking (the API does this
+    at startup), so no request pays for it.
+    """
+    retriever = get_retriever()
+    if retriever is None:
+        return
+    try:
+        retriever.load_embedder()
+    except Exception as e:
+        _disable(e)
+
+
+def rank_patterns(transaction, patterns):
+    """
+    Patterns ordered by semantic relevance when the index and the embedding
+    model are available, otherwise unchanged.
+    """
+    retriever = get_retriever()
+    if retriever is None or len(patterns) < 2:
+        return patterns
+    try:
+        return retriever.rank(transaction, patterns)
+    except Exception as e:
+        _disable(e)
+        return patterns
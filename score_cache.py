@@ -0,0 +1,88 @@
+"""
+Cache of scoring results for exact duplicate transactions.
+
+Upstream retries and replayed batches send byte-identical transactions
+again. Batch entries are keyed on the raw bytes of the aligned float32
+feature row (what the booster is fed); FraudDetector.score keys on the
+transaction's float64 values, which its pattern matches depend on too. Either
+way only an identical vector hits, never a close one. Each FraudDetector has its own cache, so it belongs to one model
+version; a reload (see model_registry.py) starts with an empty one.
+
+Environment:
+    SCORE_CACHE_SIZE=100000   entries kept (LRU); 0 disables the cache
+"""
+from collections import OrderedDict
+import os
+import threading
+import numpy as np
+
+DEFAULT_MAX_ENTRIES = int(os.getenv("SCORE_CACHE_SIZE", 100000))
+
+
+def row_keys(values):
+    """
+    Cache keys of the rows of a 2-D array: the bytes of each float32 row.
+    """
+    values = np.ascontiguousarray(values, dtype=np.float32)
+    return values.view(np.dtype((np.void, values.shape[1] * values.itemsize))).ravel().tolist()
+
+
+class ScoreCache:
+    """
+    Bounded LRU of scoring results for one model version.
+    """
+
+    def __init__(self, version, max_entries=DEFAULT_MAX_ENTRIES):
+        self.version = version
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def get_many(self, keys):
+        """
+        Cached values for `keys`, None where there is none.
+        """
+        values = []
+        with self._lock:
+            entries = self._entries
+            for key in keys:
+                value = entries.get(key)
+                if value is not None:
+                    entries.move_to_end(key)
+                values.append(value)
+            hits = len(values) - values.count(None)
+            self.hits += hits
+            self.misses += len(values) - hits
+        return values
+
+    def put(self, key, value):
+        self.put_many([key], [value])
+
+    def put_many(self, keys, values):
+        with self._lock:
+            entries = self._entries
+            for key, value in zip(keys, values):
+                entries[key] = value
+                entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "version": self.version,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,193 @@
+"""
+Offline scoring of large transaction files across a process pool.
+
+The input is split into shards (byte ranges for CSV, row groups for Parquet).
+Each shard is scored by a forked worker that shares the parent's FraudDetector
+copy-on-write, and is written to its own part file in the output directory.
+Finished parts double as checkpoints: re-running with --resume skips them,
+as long as the input, the sharding and the model version are unchanged.
+
+Usage:
+    python score_file.py transactions.csv scored/ --workers 8
+    python score_file.py transactions.parquet scored/ --format parquet --resume
+
+CSV sharding splits on newlines, so quoted fields must not contain line breaks.
+"""
+import argparse
+import io
+import json
+import logging
+import multiprocessing
+import os
+import time
+
+import pandas as pd
+
+from batch_scoring import score_chunk
+from fraud_detector import FraudDetector
+
+logger = logging.getLogger(__name__)
+
+# Bytes of CSV (or Parquet row groups) handled per task
+DEFAULT_SHARD_BYTES = 64 * 1024 * 1024
+
+# Set in the parent before forking so workers inherit it without reloading
+_detector = None
+
+
+def plan_csv_shards(path, shard_bytes):
+    """
+    Byte ranges of the CSV body aligned to line starts, plus the header columns.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        columns = pd.read_csv(io.BytesIO(f.readline()), nrows=0).columns.tolist()
+        boundaries = [f.tell()]
+        while boundaries[-1] < size:
+            f.seek(min(boundaries[-1] + shard_bytes, size))
+            f.readline()
+            boundaries.append(f.tell())
+    return columns, [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+
+def plan_parquet_shards(path, shard_bytes):
+    """
+    Groups of consecutive Parquet row groups of roughly shard_bytes each.
+    """
+    import pyarrow.parquet as pq
+
+    metadata = pq.ParquetFile(path).metadata
+    shards, current, current_bytes = [], [], 0
+    for i in range(metadata.num_row_groups):
+        current.append(i)
+        current_bytes += metadata.row_group(i).total_byte_size
+        if current_bytes >= shard_bytes:
+            shards.append(tuple(current))
+            current, current_bytes = [], 0
+    if current:
+        shards.append(tuple(current))
+    return None, shards
+
+
+def read_shard(path, kind, columns, shard):
+    if kind == "parquet":
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(path).read_row_groups(list(shard)).to_pandas()
+
+    start, end = shard
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return pd.read_csv(io.BytesIO(data), header=None, names=columns)
+
+
+def part_path(output_dir, shard_id, fmt):
+    return os.path.join(output_dir, f"part-{shard_id:05d}.{fmt}")
+
+
+def _init_worker():
+    # One XGBoost thread per process; parallelism comes from the pool
+    _detector.engine.booster.set_param({"nthread": 1})
+
+
+def score_shard(task):
+    shard_id, path, kind, columns, shard, output_dir, fmt = task
+    chunk = read_shard(path, kind, columns, shard)
+    scored = pd.concat([chunk, score_chunk(_detector, chunk)], axis=1)
+
+    # Write then rename, so a part file only exists once it is complete
+    target = part_path(output_dir, shard_id, fmt)
+    tmp = target + ".tmp"
+    if fmt == "parquet":
+        scored.to_parquet(tmp, index=False)
+    else:
+        scored.to_csv(tmp, index=False)
+    os.replace(tmp, target)
+    return shard_id, len(chunk), int(scored["fraud"].sum())
+
+
+def load_manifest(output_dir, manifest, resume):
+    path = os.path.join(output_dir, "manifest.json")
+    if resume and os.path.exists(path):
+        with open(path, "r") as f:
+            previous = json.load(f)
+        if previous.get("model_version") != manifest["model_version"]:
+            # Parts scored by another model would be mixed with this one's
+            raise ValueError(
+                f"Cannot resume: the parts in {output_dir} were scored with model "
+                f"{previous.get('model_version')}, the loaded model is {manifest['model_version']}; "
+                "start again without --resume"
+            )
+        if previous != manifest:
+            raise ValueError(
+                "Cannot resume: input file or sharding changed since the last run "
+                f"(see {path}); start again without --resume"
+            )
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def score_file(path, output_dir, workers=None, shard_bytes=DEFAULT_SHARD_BYTES, fmt="csv", resume=False):
+    global _detector
+
+    kind = "parquet" if path.endswith((".parquet", ".pq")) else "csv"
+    plan = plan_parquet_shards if kind == "parquet" else plan_csv_shards
+    columns, shards = plan(path, shard_bytes)
+
+    # Load model, scaler and compiled patterns once; forked workers share the pages
+    _detector = FraudDetector()
+
+    os.makedirs(output_dir, exist_ok=True)
+    stat = os.stat(path)
+    load_manifest(output_dir, {
+        "input": os.path.abspath(path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "shard_bytes": shard_bytes,
+        "shards": len(shards),
+        "format": fmt,
+        "model_version": _detector.model_version,
+    }, resume)
+
+    tasks = [
+        (shard_id, path, kind, columns, shard, output_dir, fmt)
+        for shard_id, shard in enumerate(shards)
+        if not (resume and os.path.exists(part_path(output_dir, shard_id, fmt)))
+    ]
+    logger.info(f"{len(shards)} shards, {len(shards) - len(tasks)} already done, {len(tasks)} to score")
+    if not tasks:
+        return
+
+    workers = workers or os.cpu_count()
+    context = multiprocessing.get_context("fork")
+
+    start = time.perf_counter()
+    rows = frauds = done = 0
+    with context.Pool(workers, initializer=_init_worker) as pool:
+        for shard_id, shard_rows, shard_frauds in pool.imap_unordered(score_shard, tasks):
+            done += 1
+            rows += shard_rows
+            frauds += shard_frauds
+            elapsed = time.perf_counter() - start
+            logger.info(
+                f"[{done}/{len(tasks)}] shard {shard_id}: {shard_rows:,} rows | "
+                f"total {rows:,} rows, {frauds:,} fraud, {rows / elapsed:,.0f} rows/s"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="CSV or Parquet file of transactions")
+    parser.add_argument("output_dir", help="Directory for part files and the manifest")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--shard-mb", type=float, default=DEFAULT_SHARD_BYTES / 2**20, help="Input megabytes per shard")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv", help="Output format of the part files")
+    parser.add_argument("--resume", action="store_true", help="Skip shards whose part file already exists")
+    args = parser.parse_args()
+
+    score_file(args.input, args.output_dir, args.workers, int(args.shard_mb * 2**20), args.format, args.resume)
+
+
+if __name__ == "__main__":
+    main()
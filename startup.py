@@ -0,0 +1,64 @@
+"""
+Startup-time report: how long importing and loading each component takes.
+
+Heavy pieces (detector, LLM client, LangGraph workflow) record their load
+time with `timed` when they are first created, so a running process can
+report what it has paid for so far. Running this module measures a cold
+start step by step in a fresh interpreter.
+
+Usage:
+    python startup.py
+"""
+from contextlib import contextmanager
+import importlib
+import time
+
+# Seconds spent per stage in this process, in the order the stages ran
+STARTUP_TIMINGS = {}
+
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_TIMINGS[stage] = STARTUP_TIMINGS.get(stage, 0.0) + time.perf_counter() - start
+
+
+def startup_report():
+    total = sum(STARTUP_TIMINGS.values())
+    return {
+        "stages_ms": {stage: round(seconds * 1000, 2) for stage, seconds in STARTUP_TIMINGS.items()},
+        "total_ms": round(total * 1000, 2),
+    }
+
+
+def main():
+    # Run as a script this file is __main__; record into the module the components import
+    startup = importlib.import_module("startup")
+
+    for module in ["numpy", "pandas", "xgboost", "fraud_detector", "llm_chain", "workflow", "Api"]:
+        with startup.timed(f"import {module}"):
+            importlib.import_module(module)
+
+    # Lazily loaded components, in the order a request would need them
+    from fraud_detector import get_detector
+    from llm_chain import get_llm
+    from pattern_retriever import get_retriever
+    from workflow import get_fraud_workflow
+
+    get_detector()
+    get_fraud_workflow()
+    get_retriever()
+    get_llm()
+
+    report = startup.startup_report()
+    width = max(len(stage) for stage in report["stages_ms"])
+    for stage, ms in report["stages_ms"].items():
+        print(f"{stage:<{width}}  {ms:10.2f} ms")
+    print(f"{'total':<{width}}  {report['total_ms']:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
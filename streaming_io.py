@@ -0,0 +1,224 @@
+"""
+Constant-memory streaming scoring for CSV, Parquet and Arrow IPC files.
+
+Input is read as Arrow record batches (CSV through pandas' chunked parser)
+with columns projected down to the model's features. Each batch is copied into one preallocated float32 buffer
+that the booster scores directly, and results are appended to the output
+file batch by batch. The batch size follows from a memory budget, so peak
+memory does not depend on the size of the input.
+
+Usage:
+    python streaming_io.py transactions.parquet scored.parquet --memory-mb 256
+    python streaming_io.py transactions.csv scored.csv --keep id
+"""
+import argparse
+import logging
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.ipc as pa_ipc
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEMORY_MB = 256
+
+# Rough bytes held per input value across parse buffers, Arrow columns,
+# the float32 model buffer and the result batch
+BYTES_PER_VALUE = 48
+
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+IPC_EXTENSIONS = (".arrow", ".feather", ".ipc")
+
+
+def rows_for_budget(memory_mb, n_columns):
+    """
+    Rows per batch that keep one batch in flight within memory_mb.
+    """
+    return max(1024, int(memory_mb * 2**20 / (max(n_columns, 1) * BYTES_PER_VALUE)))
+
+
+def detect_format(source):
+    name = source if isinstance(source, str) else getattr(source, "name", "")
+    name = name.lower()
+    if name.endswith(PARQUET_EXTENSIONS):
+        return "parquet"
+    if name.endswith(IPC_EXTENSIONS):
+        return "ipc"
+    return "csv"
+
+
+def _csv_header(source):
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            line = f.readline()
+    else:
+        position = source.tell()
+        line = source.readline()
+        source.seek(position)
+    if isinstance(line, bytes):
+        line = line.decode("utf-8")
+    return [name.strip().strip('"') for name in line.rstrip("\r\n").split(",")]
+
+
+def _slices(batch, batch_rows):
+    # Zero-copy slices so no batch exceeds the budgeted row count
+    for offset in range(0, batch.num_rows, batch_rows):
+        yield batch.slice(offset, batch_rows)
+
+
+def iter_record_batches(source, columns=None, batch_rows=65536, fmt=None):
+    """
+    Yield Arrow record batches of at most batch_rows rows. With `columns`,
+    only those columns (the ones present in the input) are read.
+    """
+    fmt = fmt or detect_format(source)
+
+    if fmt == "parquet":
+        parquet = pq.ParquetFile(source)
+        names = parquet.schema_arrow.names
+        projection = [c for c in columns if c in names] if columns is not None else None
+        yield from parquet.iter_batches(batch_size=batch_rows, columns=projection)
+        return
+
+    if fmt == "ipc":
+        try:
+            reader = pa_ipc.open_file(source)
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        except pa.ArrowInvalid:
+            if not isinstance(source, str):
+                source.seek(0)
+            batches = pa_ipc.open_stream(source)
+        for batch in batches:
+            if columns is not None:
+                batch = batch.select([c for c in columns if c in batch.schema.names])
+            yield from _slices(batch, batch_rows)
+        return
+
+    header = _csv_header(source)
+    projection = [c for c in columns if c in header] if columns is not None else None
+    # pandas' chunked C parser keeps memory bounded; Arrow's streaming CSV reader reads far ahead
+    for chunk in pd.read_csv(source, chunksize=batch_rows, usecols=projection):
+        yield pa.RecordBatch.from_pandas(chunk, preserve_index=False)
+
+
+def iter_frames(source, batch_rows=65536, columns=None, fmt=None):
+    """
+    iter_record_batches as pandas DataFrames whose index keeps counting across
+    batches (the row number within the file).
+    """
+    offset = 0
+    for batch in iter_record_batches(source, columns, batch_rows, fmt):
+        frame = batch.to_pandas()
+        frame.index = range(offset, offset + len(frame))
+        offset += len(frame)
+        yield frame
+
+
+class FeatureBuffer:
+    """
+    Preallocated, C-contiguous float32 (batch_rows, n_features) model input.
+    Each batch's columns are copied straight from Arrow into it; features
+    absent from the input stay 0.0, as in FraudDetector.predict.
+    """
+
+    def __init__(self, feature_names, batch_rows):
+        self.feature_names = list(feature_names)
+        self.values = np.zeros((batch_rows, len(self.feature_names)), dtype=np.float32)
+
+    def fill(self, batch):
+        n = batch.num_rows
+        view = self.values[:n]
+        present = []
+        for j, feature in enumerate(self.feature_names):
+            if feature in batch.schema.names:
+                # Zero-copy for null-free numeric columns; nulls become NaN (missing)
+                column = batch.column(feature).to_numpy(zero_copy_only=False)
+                np.copyto(view[:, j], column, casting="unsafe")
+                present.append(feature)
+            else:
+                view[:, j] = 0.0
+                present.append(None)
+        return view, present
+
+
+class ResultWriter:
+    """
+    Appends record batches to a Parquet or CSV file as they are produced.
+    """
+
+    def __init__(self, path, fmt=None):
+        self.path = path
+        self.fmt = fmt or ("parquet" if path.lower().endswith(PARQUET_EXTENSIONS) else "csv")
+        self._writer = None
+
+    def write(self, batch):
+        if self._writer is None:
+            if self.fmt == "parquet":
+                self._writer = pq.ParquetWriter(self.path, batch.schema)
+            else:
+                self._writer = pa_csv.CSVWriter(self.path, batch.schema)
+        self._writer.write_batch(batch)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def stream_score(detector, source, output, memory_mb=DEFAULT_MEMORY_MB, keep_columns=()):
+    """
+    Score `source` into `output` batch by batch with a fixed memory ceiling.
+    Output columns: keep_columns, the projected features, confidence, fraud,
+    is_borderline, the number of matching patterns and the model version.
+    Returns the row count.
+    """
+    feature_names = detector.metadata['feature_names']
+    keep_columns = [c for c in keep_columns if c not in feature_names]
+    batch_rows = rows_for_budget(memory_mb, len(feature_names) + len(keep_columns))
+    buffer = FeatureBuffer(feature_names, batch_rows)
+
+    rows = frauds = 0
+    start = time.perf_counter()
+    with ResultWriter(output) as writer:
+        for batch in iter_record_batches(source, keep_columns + feature_names, batch_rows):
+            values, present = buffer.fill(batch)
+            # Through the cascade pre-filter when there is one, like every other scoring path
+            verdicts = detector.verdicts(detector.predict_proba(values))
+            matches = detector.pattern_matcher.evaluate(detector.pattern_matcher.array_matrix(values, present))
+
+            for name, column in verdicts.items():
+                batch = batch.append_column(name, pa.array(column))
+            batch = batch.append_column("patterns", pa.array(matches.sum(axis=1)))
+            batch = batch.append_column("model_version", pa.repeat(detector.model_version, batch.num_rows))
+            writer.write(batch)
+
+            rows += batch.num_rows
+            frauds += int(verdicts["fraud"].sum())
+            logger.info(f"{rows:,} rows scored, {frauds:,} fraud, {rows / (time.perf_counter() - start):,.0f} rows/s")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="CSV, Parquet or Arrow IPC file of transactions")
+    parser.add_argument("output", help="Output .parquet or .csv file")
+    parser.add_argument("--memory-mb", type=float, default=DEFAULT_MEMORY_MB, help="Memory budget for in-flight batches")
+    parser.add_argument("--keep", nargs="*", default=[], help="Extra input columns copied to the output (e.g. id)")
+    args = parser.parse_args()
+
+    from fraud_detector import get_detector
+
+    stream_score(get_detector(), args.input, args.output, args.memory_mb, args.keep)
+
+
+if __name__ == "__main__":
+    main()
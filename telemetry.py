@@ -0,0 +1,230 @@
+"""
+Per-stage latency histograms, counters and an optional per-request trace log.
+
+Code paths wrap their stages in `stage(name)` and bump counters with
+`count(name)`. Everything is kept in process and rendered in Prometheus
+text format by `render()` (served at GET /metrics by the API).
+
+Environment:
+    TELEMETRY_ENABLED=0   turn stages, counters and traces into no-ops
+    TRACE_LOG=path        append one JSON line per traced request to path
+"""
+from contextlib import nullcontext
+from contextvars import ContextVar
+from bisect import bisect_left
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+ENABLED = os.getenv("TELEMETRY_ENABLED", "1") != "0"
+TRACE_LOG = os.getenv("TRACE_LOG")
+
+# Metric name prefix
+NAMESPACE = "fraudshield"
+
+# Upper bounds (seconds) of the latency histogram buckets, 50µs to 30s
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+COUNTER_HELP = {
+    "requests": "Transactions scored",
+    "fraud": "Transactions flagged as fraud",
+    "borderline": "Transactions in the borderline band",
+    "llm_calls": "LLM calls made",
+    "llm_cache_hits": "LLM explanations served from the cache",
+    "llm_cache_misses": "LLM explanations not found in the cache",
+    "score_cache_hits": "Transactions whose score came from the duplicate cache",
+    "cascade_cleared": "Transactions cleared by the cascade pre-filter without the full model",
+    "model_reloads": "Model reloads by outcome (swapped, rejected)",
+    "explanations": "Explanations by policy tier (template, llm, deferred, on_demand)",
+    "errors": "Errors by stage",
+}
+
+# Shared no-op context manager returned while disabled
+_NULL = nullcontext()
+
+# Stages of the request being traced, if any: a list of (stage, seconds)
+_trace = ContextVar("fraudshield_trace", default=None)
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+
+trace_logger = logging.getLogger("fraudshield.trace")
+if TRACE_LOG:
+    _handler = logging.FileHandler(TRACE_LOG)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    trace_logger.addHandler(_handler)
+    trace_logger.setLevel(logging.INFO)
+    trace_logger.propagate = False
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram (cumulative on render, like Prometheus).
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+def observe(name, seconds):
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(seconds)
+    spans = _trace.get()
+    if spans is not None:
+        spans.append((name, seconds))
+
+
+def count(name, value=1, **labels):
+    if not ENABLED:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.start)
+        if exc_type is not None:
+            count("errors", stage=self.name)
+        return False
+
+
+def stage(name):
+    """
+    Context manager timing one stage into the `name` latency histogram.
+    An exception escaping the stage is counted as an error of that stage.
+    """
+    return _Stage(name) if ENABLED else _NULL
+
+
+class _Collect:
+    __slots__ = ("parent", "spans", "token")
+
+    def __enter__(self):
+        self.parent = _trace.get()
+        self.spans = []
+        self.token = _trace.set(self.spans)
+        return self.spans
+
+    def __exit__(self, exc_type, exc, tb):
+        _trace.reset(self.token)
+        if self.parent is not None:
+            self.parent.extend(self.spans)
+        return False
+
+
+def collect_stages():
+    """
+    Context manager yielding the list of (stage, seconds) pairs timed inside
+    it. They still reach any enclosing trace.
+    """
+    return _Collect() if ENABLED else nullcontext([])
+
+
+class _Trace(_Collect):
+    __slots__ = ("kind", "fields", "start")
+
+    def __init__(self, kind, fields):
+        self.kind = kind
+        self.fields = fields
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        total = time.perf_counter() - self.start
+        super().__exit__(exc_type, exc, tb)
+        trace_logger.info(json.dumps({
+            "trace_id": uuid.uuid4().hex,
+            "kind": self.kind,
+            "ts": time.time(),
+            "total_ms": round(total * 1000, 3),
+            "stages": [{"stage": name, "ms": round(seconds * 1000, 3)} for name, seconds in self.spans],
+            "error": exc_type.__name__ if exc_type is not None else None,
+            **self.fields,
+        }, default=str))
+        return False
+
+
+def trace(kind, **fields):
+    """
+    Context manager that writes one JSON line with every stage timed inside
+    it to TRACE_LOG. A no-op without TRACE_LOG or inside another trace.
+    """
+    if not (ENABLED and TRACE_LOG) or _trace.get() is not None:
+        return _NULL
+    return _Trace(kind, fields)
+
+
+def _labels(pairs):
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}" if pairs else ""
+
+
+def render():
+    """
+    All histograms and counters in Prometheus text exposition format.
+    """
+    with _lock:
+        histograms = {name: (list(h.counts), h.sum, h.count) for name, h in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = [
+        f"# HELP {NAMESPACE}_stage_seconds Latency of each scoring stage",
+        f"# TYPE {NAMESPACE}_stage_seconds histogram",
+    ]
+    for name in sorted(histograms):
+        counts, total, n = histograms[name]
+        cumulative = 0
+        for bound, bucket in zip(LATENCY_BUCKETS + ("+Inf",), counts):
+            cumulative += bucket
+            lines.append(f'{NAMESPACE}_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'{NAMESPACE}_stage_seconds_sum{{stage="{name}"}} {total:.9f}')
+        lines.append(f'{NAMESPACE}_stage_seconds_count{{stage="{name}"}} {n}')
+
+    for name in sorted({name for name, _ in counters} | set(COUNTER_HELP)):
+        metric = f"{NAMESPACE}_{name}_total"
+        lines.append(f"# HELP {metric} {COUNTER_HELP.get(name, name)}")
+        lines.append(f"# TYPE {metric} counter")
+        series = sorted((labels, value) for (counter, labels), value in counters.items() if counter == name)
+        for labels, value in series or [((), 0)]:
+            lines.append(f"{metric}{_labels(labels)} {value}")
+
+    requests = sum(value for (name, _), value in counters.items() if name == "requests")
+    borderline = sum(value for (name, _), value in counters.items() if name == "borderline")
+    lines.append(f"# HELP {NAMESPACE}_borderline_ratio Share of scored transactions in the borderline band")
+    lines.append(f"# TYPE {NAMESPACE}_borderline_ratio gauge")
+    lines.append(f"{NAMESPACE}_borderline_ratio {borderline / requests if requests else 0.0}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules live at the top level; the fake chat model lives with the benchmarks
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+os.chdir(ROOT)
@@ -0,0 +1,153 @@
+"""
+Batched explanations against a local fake chat model (no Groq calls).
+"""
+import asyncio
+import time
+
+import pytest
+
+import llm_chain
+import llm_scheduler
+from fake_llm import FakeChatModel
+
+
+@pytest.fixture(autouse=True)
+def scheduler():
+    """
+    The injected models go through the LLM scheduler; give it room for every
+    call of a batch and no rate limits, so only llm_chain bounds concurrency.
+    """
+    scheduler = llm_scheduler.LLMScheduler(requests_per_minute=1e12, tokens_per_minute=1e12, concurrency=32)
+    previous = llm_scheduler.set_scheduler(scheduler)
+    yield scheduler
+    llm_scheduler.set_scheduler(previous)
+    scheduler.stop()
+
+
+class TrackingChatModel(FakeChatModel):
+    """
+    FakeChatModel with a per-prompt latency that records how many calls
+    overlap.
+    """
+
+    def __init__(self, latencies):
+        super().__init__()
+        self.latencies = latencies
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def ainvoke(self, prompt):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            amount = float(prompt.split("'Amount': ")[1].split("}")[0])
+            await asyncio.sleep(self.latencies.get(amount, 0.0))
+            return self._answer(prompt)
+        finally:
+            self.in_flight -= 1
+
+
+def make_items(count):
+    return [
+        {
+            "transaction": {"V14": -5.0, "Amount": float(i)},
+            "fraud_result": {"fraud": True, "confidence": 0.9, "is_borderline": False},
+            # A single pattern, so no ranking (and no embedding model) is involved
+            "patterns": [{"feature": "V14", "condition": "< -4", "description": "Strong fraud signal"}],
+        }
+        for i in range(count)
+    ]
+
+
+def expected_answer(item):
+    prompt = llm_chain.build_prompt(item["transaction"], item["fraud_result"], item["patterns"])
+    return FakeChatModel()._answer(prompt).content
+
+
+def test_results_keep_input_order():
+    items = make_items(10)
+    # Later items answer first
+    model = TrackingChatModel({float(i): 0.01 * (10 - i) for i in range(10)})
+
+    results = llm_chain.process_transactions(items, max_concurrency=10, model=model, cache=None)
+
+    assert results == [expected_answer(item) for item in items]
+
+
+def test_calls_overlap_up_to_the_concurrency_limit():
+    items = make_items(20)
+    model = TrackingChatModel({float(i): 0.05 for i in range(20)})
+
+    start = time.perf_counter()
+    results = llm_chain.process_transactions(items, max_concurrency=5, model=model, cache=None)
+    elapsed = time.perf_counter() - start
+
+    assert len(results) == 20
+    assert model.max_in_flight == 5
+    # Four waves of 0.05 s rather than twenty sequential calls (1 s)
+    assert elapsed < 0.5
+
+
+def test_timeout_only_fails_the_slow_call():
+    items = make_items(3)
+    model = TrackingChatModel({1.0: 1.0})
+
+    results = llm_chain.process_transactions(items, timeout=0.1, model=model, cache=None)
+
+    assert results[0] == expected_answer(items[0])
+    assert results[1].startswith("Error: LLM explanation timed out")
+    assert results[2] == expected_answer(items[2])
+
+
+@pytest.mark.parametrize("count", [0, 1])
+def test_small_batches(count):
+    items = make_items(count)
+    results = llm_chain.process_transactions(items, model=FakeChatModel(), cache=None)
+    assert results == [expected_answer(item) for item in items]
+
+
+def test_injected_model_goes_through_the_scheduler(scheduler):
+    item = make_items(1)[0]
+
+    result = llm_chain.process_transaction(**item, model=FakeChatModel(), cache=None)
+
+    assert result == expected_answer(item)
+    assert scheduler.metrics()["completed"] == 1
+
+
+def test_prompts_are_built_off_the_event_loop(monkeypatch):
+    build_prompt = llm_chain.build_prompt
+
+    def slow_build_prompt(*args):
+        # Stands in for embedding the transaction to rank its patterns
+        time.sleep(0.2)
+        return build_prompt(*args)
+
+    monkeypatch.setattr(llm_chain, "build_prompt", slow_build_prompt)
+    items = make_items(3)
+
+    start = time.perf_counter()
+    results = llm_chain.process_transactions(items, model=FakeChatModel(), cache=None)
+    elapsed = time.perf_counter() - start
+
+    # Built side by side rather than one after another on the loop (0.6 s)
+    assert elapsed < 0.5
+    assert results == [expected_answer(item) for item in items]
+
+
+def test_cached_explanations_are_per_model_version():
+    from explanation_cache import ExplanationCache
+
+    cache = ExplanationCache(path=None)
+    model = FakeChatModel()
+    item = make_items(1)[0]
+    item["fraud_result"]["model_version"] = "1.0.0+aaaaaaaa"
+
+    for _ in range(2):
+        llm_chain.process_transaction(**item, model=model, cache=cache)
+    assert (model.calls, cache.stats()["misses"]) == (1, 1)
+
+    # The same transaction scored by a reloaded model is explained again
+    item["fraud_result"]["model_version"] = "1.0.0+bbbbbbbb"
+    llm_chain.process_transaction(**item, model=model, cache=cache)
+    assert (model.calls, cache.stats()["misses"]) == (2, 2)
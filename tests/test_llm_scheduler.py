@@ -0,0 +1,208 @@
+"""
+The LLM scheduler against a scripted fake chat model (no Groq calls).
+"""
+import asyncio
+import random
+import threading
+import time
+
+import pytest
+
+import llm_scheduler
+from llm_scheduler import LLMScheduler, SchedulerBusy, TokenBucket, request_priority
+from fake_llm import FakeResponse
+
+
+class APIError(Exception):
+    """
+    Error shaped like the Groq client's: a status code and a response with headers.
+    """
+
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+        self.response = type("Response", (), {"status_code": status_code, "headers": headers})()
+
+
+class ScriptedChatModel:
+    """
+    Raises or answers according to `outcomes` (exceptions are raised, the
+    last outcome repeats), and records each prompt in call order. While
+    `gate` is unset, calls wait for it.
+    """
+
+    def __init__(self, outcomes=None, gate=None):
+        self.outcomes = list(outcomes or [])
+        self.gate = gate
+        self.prompts = []
+
+    async def ainvoke(self, prompt):
+        self.prompts.append(prompt)
+        while self.gate is not None and not self.gate.is_set():
+            await asyncio.sleep(0.001)
+        outcome = (self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]) if self.outcomes else "ok"
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+
+def make_scheduler(model, **kwargs):
+    options = {"requests_per_minute": 1e12, "tokens_per_minute": 1e12, "base_delay": 0.001, "max_delay": 0.001}
+    return LLMScheduler(model, **{**options, **kwargs})
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.001)
+
+
+@pytest.fixture
+def schedulers():
+    started = []
+    yield started
+    for scheduler in started:
+        scheduler.stop()
+
+
+def test_token_bucket_refills_at_its_rate():
+    now = [0.0]
+    bucket = TokenBucket(60, clock=lambda: now[0])
+
+    assert bucket.wait_time(60) == 0.0
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+
+    now[0] += 0.5
+    assert bucket.wait_time(1) == pytest.approx(0.5)
+    # Never more than the capacity, however long it waits
+    now[0] += 3600
+    assert bucket.wait_time(60) == 0.0
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+
+
+def test_requests_are_served_by_priority(schedulers):
+    gate = threading.Event()
+    model = ScriptedChatModel(gate=gate)
+    scheduler = make_scheduler(model, concurrency=1)
+    schedulers.append(scheduler)
+
+    # Occupies the only worker while the others queue up
+    first = scheduler.submit("first")
+    wait_for(lambda: model.prompts == ["first"])
+    results = {
+        "legit": {"fraud": False, "is_borderline": False, "confidence": 0.05},
+        "borderline": {"fraud": False, "is_borderline": True, "confidence": 0.4},
+        "fraud": {"fraud": True, "is_borderline": False, "confidence": 0.9},
+        "likelier fraud": {"fraud": True, "is_borderline": False, "confidence": 0.99},
+    }
+    futures = [scheduler.submit(name, request_priority(result)) for name, result in results.items()]
+    gate.set()
+
+    first.result(timeout=5)
+    for future in futures:
+        future.result(timeout=5)
+    assert model.prompts == ["first", "likelier fraud", "fraud", "borderline", "legit"]
+
+
+def test_rate_limited_call_is_retried_after_retry_after(schedulers):
+    model = ScriptedChatModel([APIError(429, retry_after=0.2), "ok"])
+    scheduler = make_scheduler(model)
+    schedulers.append(scheduler)
+
+    start = time.perf_counter()
+    assert scheduler.submit("prompt").result(timeout=5) == "ok"
+
+    assert time.perf_counter() - start >= 0.2
+    assert len(model.prompts) == 2
+    metrics = scheduler.metrics()
+    assert (metrics["retries"], metrics["rate_limited"], metrics["completed"]) == (1, 1, 1)
+
+
+def test_backoff_is_jittered_and_capped():
+    scheduler = LLMScheduler(base_delay=0.5, max_delay=4.0)
+    random.seed(0)
+
+    for attempt in range(8):
+        delays = [scheduler._backoff(attempt, APIError(503)) for _ in range(50)]
+        assert all(0 <= delay <= min(4.0, 0.5 * 2 ** attempt) for delay in delays)
+        assert len(set(delays)) > 1
+    # A longer Retry-After from the server wins over the jitter
+    assert scheduler._backoff(0, APIError(429, retry_after=10)) == 10.0
+
+
+def test_server_errors_are_retried_up_to_max_retries(schedulers):
+    model = ScriptedChatModel([APIError(503)])
+    scheduler = make_scheduler(model, max_retries=2)
+    schedulers.append(scheduler)
+
+    with pytest.raises(APIError):
+        scheduler.submit("prompt").result(timeout=5)
+
+    assert len(model.prompts) == 3
+    assert scheduler.metrics()["failed"] == 1
+
+
+def test_client_errors_are_not_retried(schedulers):
+    model = ScriptedChatModel([APIError(400), "ok"])
+    scheduler = make_scheduler(model)
+    schedulers.append(scheduler)
+
+    with pytest.raises(APIError):
+        scheduler.submit("prompt").result(timeout=5)
+
+    assert len(model.prompts) == 1
+    assert scheduler.metrics()["retries"] == 0
+
+
+def test_full_queue_raises_scheduler_busy(schedulers):
+    gate = threading.Event()
+    model = ScriptedChatModel(gate=gate)
+    scheduler = make_scheduler(model, concurrency=1, max_queue_depth=2)
+    schedulers.append(scheduler)
+
+    running = scheduler.submit("running")
+    wait_for(lambda: model.prompts == ["running"])
+    queued = [scheduler.submit("queued 1"), scheduler.submit("queued 2")]
+
+    with pytest.raises(SchedulerBusy):
+        scheduler.submit("rejected", block=False)
+    with pytest.raises(SchedulerBusy):
+        scheduler.submit("rejected", timeout=0.05)
+    with pytest.raises(SchedulerBusy):
+        asyncio.run(scheduler.asubmit("rejected"))
+    assert scheduler.metrics()["rejected"] == 3
+
+    gate.set()
+    assert [future.result(timeout=5) for future in [running, *queued]] == ["ok"] * 3
+    assert "rejected" not in model.prompts
+
+
+def test_stop_fails_queued_requests():
+    gate = threading.Event()
+    model = ScriptedChatModel(gate=gate)
+    scheduler = make_scheduler(model, concurrency=1)
+
+    running = scheduler.submit("running")
+    wait_for(lambda: model.prompts == ["running"])
+    queued = scheduler.submit("queued")
+    scheduler.stop()
+
+    for future in (running, queued):
+        with pytest.raises(RuntimeError, match="stopped"):
+            future.result(timeout=5)
+
+
+def test_shutdown_forgets_the_process_scheduler():
+    scheduler = make_scheduler(ScriptedChatModel())
+    previous = llm_scheduler.set_scheduler(scheduler)
+    try:
+        assert llm_scheduler.get_scheduler().submit("prompt").result(timeout=5) == "ok"
+        llm_scheduler.shutdown()
+        assert llm_scheduler.get_scheduler() is not scheduler
+    finally:
+        llm_scheduler.shutdown()
+        llm_scheduler.set_scheduler(previous)
@@ -0,0 +1,83 @@
+"""
+NativeEngine against the pickled XGBClassifier it is exported from.
+"""
+import json
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from native_engine import MODEL_PATH, SCALER_PATH, NativeEngine, export_native
+
+METADATA_PATH = "models/model_metadata.json"
+
+# Largest difference allowed between the native and pickled probabilities
+TOLERANCE = 1e-6
+
+pytestmark = pytest.mark.skipif(
+    not (os.path.exists(MODEL_PATH) and os.path.exists(SCALER_PATH)), reason="no pickled model deployed"
+)
+
+
+@pytest.fixture(scope="module")
+def pickled_model():
+    import joblib
+
+    with warnings.catch_warnings():
+        # XGBoost warns about unpickling a model saved by another version
+        warnings.simplefilter("ignore")
+        return joblib.load(MODEL_PATH)
+
+
+@pytest.fixture(scope="module")
+def feature_names():
+    with open(METADATA_PATH, "r") as f:
+        return json.load(f)["feature_names"]
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory, feature_names):
+    # Exported from the pickles on disk, so stale artifacts in models/ can't pass for them
+    directory = tmp_path_factory.mktemp("native")
+    model_path = str(directory / "fraud_model.ubj")
+    scaler_path = str(directory / "amount_scaler.json")
+    export_native(native_model_path=model_path, native_scaler_path=scaler_path)
+    return NativeEngine(feature_names, model_path=model_path, scaler_path=scaler_path)
+
+
+@pytest.fixture(scope="module")
+def rows(feature_names):
+    """
+    Random rows with about one value in ten missing, plus an all-NaN row.
+    """
+    rng = np.random.default_rng(0)
+    values = rng.normal(scale=5, size=(2000, len(feature_names)))
+    values[rng.random(values.shape) < 0.1] = np.nan
+    values[0] = np.nan
+    return pd.DataFrame(values, columns=feature_names)
+
+
+def test_batch_probabilities_match_the_pickled_model(engine, pickled_model, rows):
+    native = engine.predict_proba(rows.to_numpy(dtype=np.float32))
+    pickled = pickled_model.predict_proba(rows)[:, 1]
+
+    assert native.shape == pickled.shape
+    assert np.abs(native - pickled).max() <= TOLERANCE
+
+
+def test_contributions_give_the_same_probabilities(engine, rows):
+    values = rows.head(200).to_numpy(dtype=np.float32)
+    probs, contributions = engine.predict_contributions(values)
+
+    assert np.abs(probs - engine.predict_proba(values)).max() <= TOLERANCE
+    assert contributions.shape == values.shape
+
+
+def test_single_rows_match_the_batch(engine, rows):
+    head = rows.head(100)
+    expected = engine.predict_proba(head.to_numpy(dtype=np.float32))
+
+    for transaction, prob in zip(head.to_dict("records"), expected):
+        assert abs(engine.predict_one(transaction) - float(prob)) <= TOLERANCE
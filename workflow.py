@@ -1,100 +1,166 @@
-from langgraph.graph import StateGraph, END
-from typing import TypedDict, List, Optional, Annotated
-from fraud_detector import FraudDetector
-from llm_chain import process_transaction
-import json
-
-# Initialize components
-detector = FraudDetector()
-
-# Define state schema
-class FraudCheckState(TypedDict):
-    transaction: dict
-    fraud_result: Optional[dict]
-    patterns: Optional[List[dict]]
-    explanation: Optional[str]
-    error: Optional[bool]  # Add an error field to the state
-
-# Define nodes
-def detect_fraud(state: FraudCheckState) -> FraudCheckState:
-    try:
-        fraud_result = detector.predict(state["transaction"])
-        return {
-            **state,
-            "fraud_result": fraud_result,
-            "error": False
-        }
-    except Exception as e:
-        return {
-            **state,
-            "error": True
-        }
-
-def retrieve_patterns(state: FraudCheckState) -> FraudCheckState:
-    try:
-        patterns = detector.get_relevant_patterns(state["transaction"])
-        return {
-            **state,
-            "patterns": patterns,
-            "error": False
-        }
-    except Exception as e:
-        return {
-            **state,
-            "error": True
-        }
-
-def generate_explanation(state: FraudCheckState) -> FraudCheckState:
-    try:
-        explanation = process_transaction(
-            state["transaction"],
-            state["fraud_result"],
-            state["patterns"]
-        )
-        return {
-            **state,
-            "explanation": explanation,
-            "error": False
-        }
-    except Exception as e:
-        return {
-            **state,
-            "error": True
-        }
-
-def handle_error(state: FraudCheckState) -> FraudCheckState:
-    return {
-        **state,
-        "explanation": "Error: Failed to process transaction"
-    }
-
-# Build workflow
-workflow = StateGraph(FraudCheckState)
-
-# Add nodes
-workflow.add_node("detect_fraud", detect_fraud)
-workflow.add_node("retrieve_patterns", retrieve_patterns)
-workflow.add_node("generate_explanation", generate_explanation)
-workflow.add_node("handle_error", handle_error)
-
-# Define edges
-workflow.add_edge("detect_fraud", "retrieve_patterns")
-workflow.add_edge("retrieve_patterns", "generate_explanation")
-workflow.add_edge("generate_explanation", END)
-
-# Add conditional edges for error handling
-def decide_next_node(state: FraudCheckState):
-    if state.get("error"):
-        return "handle_error"
-    else:
-        return END
-
-workflow.add_conditional_edges("detect_fraud", decide_next_node)
-workflow.add_conditional_edges("retrieve_patterns", decide_next_node)
-workflow.add_conditional_edges("generate_explanation", decide_next_node)
-
-# Set the entry point
-workflow.set_entry_point("detect_fraud")
-
-# Compile
-fraud_workflow = workflow.compile()
\ No newline at end of file
+from typing import TypedDict, List, Optional, Annotated
+from fraud_detector import get_detector
+from llm_chain import process_transaction
+from explanation_policy import policy as explanation_policy, LLM
+from startup import timed
+import functools
+import json
+import threading
+import time
+import telemetry
+
+# Define state schema
+class FraudCheckState(TypedDict):
+    transaction: dict
+    fraud_result: Optional[dict]
+    patterns: Optional[List[dict]]
+    explanation: Optional[str]
+    explanation_tier: Optional[str]  # "template", "llm" or "deferred" (see explanation_policy)
+    error: Optional[bool]  # Add an error field to the state
+
+# Define nodes
+# Each node returns only the keys it changes; LangGraph merges them into the state.
+def detect_fraud(state: FraudCheckState) -> dict:
+    try:
+        # Probability and pattern matches are computed once here and reused downstream
+        fraud_result, patterns = get_detector().score(state["transaction"])
+        return {
+            "fraud_result": fraud_result,
+            "patterns": patterns,
+            "error": "error" in fraud_result
+        }
+    except Exception as e:
+        telemetry.count("errors", stage="node_detect_fraud")
+        return {"error": True}
+
+def generate_explanation(state: FraudCheckState) -> dict:
+    try:
+        # Only borderline cases call the LLM here; the rest keep the detector's explanation
+        tier = explanation_policy.choose(state["fraud_result"])
+        if tier == LLM:
+            explanation = process_transaction(
+                state["transaction"],
+                state["fraud_result"],
+                state["patterns"],
+                is_borderline=bool(state["fraud_result"].get("is_borderline", False))
+            )
+        else:
+            explanation = state["fraud_result"]["explanation"]
+        return {
+            "explanation": explanation,
+            "explanation_tier": tier,
+            "error": False
+        }
+    except Exception as e:
+        telemetry.count("errors", stage="node_generate_explanation")
+        return {"error": True}
+
+def handle_error(state: FraudCheckState) -> dict:
+    return {"explanation": "Error: Failed to process transaction"}
+
+def timed_node(node):
+    """
+    Record a node's latency as the stage "node_<function name>".
+    """
+    name = f"node_{node.__name__}"
+
+    @functools.wraps(node)
+    def wrapper(state):
+        with telemetry.stage(name):
+            return node(state)
+    return wrapper
+
+class InstrumentedWorkflow:
+    """
+    Compiled graph wrapper that times each invoke as the "workflow" stage,
+    and the part of it not spent inside nodes as "graph_overhead".
+    Everything else is delegated to the graph.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def invoke(self, state, *args, **kwargs):
+        if not telemetry.ENABLED:
+            return self.graph.invoke(state, *args, **kwargs)
+
+        with telemetry.trace("workflow"):
+            start = time.perf_counter()
+            with telemetry.collect_stages() as spans:
+                result = self.graph.invoke(state, *args, **kwargs)
+            total = time.perf_counter() - start
+            in_nodes = sum(seconds for stage, seconds in spans if stage.startswith("node_"))
+            telemetry.observe("workflow", total)
+            telemetry.observe("graph_overhead", max(total - in_nodes, 0.0))
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.graph, name)
+
+def build_workflow():
+    # LangGraph is only imported when the graph is first needed
+    from langgraph.graph import StateGraph, END
+
+    workflow = StateGraph(FraudCheckState)
+
+    # Add nodes
+    workflow.add_node("detect_fraud", timed_node(detect_fraud))
+    workflow.add_node("generate_explanation", timed_node(generate_explanation))
+    workflow.add_node("handle_error", timed_node(handle_error))
+
+    # Route to the error handler or on to the next step
+    def after_detection(state: FraudCheckState):
+        return "handle_error" if state.get("error") else "generate_explanation"
+
+    def after_explanation(state: FraudCheckState):
+        return "handle_error" if state.get("error") else END
+
+    workflow.add_conditional_edges("detect_fraud", after_detection)
+    workflow.add_conditional_edges("generate_explanation", after_explanation)
+    workflow.add_edge("handle_error", END)
+
+    # Set the entry point
+    workflow.set_entry_point("detect_fraud")
+
+    # Compile
+    return InstrumentedWorkflow(workflow.compile())
+
+_fraud_workflow = None
+_fraud_workflow_lock = threading.Lock()
+
+def get_fraud_workflow():
+    """
+    The compiled fraud workflow, built once per process on first use.
+    """
+    global _fraud_workflow
+    if _fraud_workflow is None:
+        with _fraud_workflow_lock:
+            if _fraud_workflow is None:
+                with timed("workflow build"):
+                    _fraud_workflow = build_workflow()
+    return _fraud_workflow
+
+def __getattr__(name):
+    # `from workflow import fraud_workflow` still works, it just builds the graph then
+    if name == "fraud_workflow":
+        return get_fraud_workflow()
+    if name == "detector":
+        return get_detector()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def score_transaction(transaction):
+    """
+    Fast path for scoring without the LLM: runs the detector directly and
+    returns a state shaped like fraud_workflow.invoke, skipping the graph.
+    The explanation is the detector's own pattern-based explanation.
+    """
+    with telemetry.trace("score_transaction"):
+        fraud_result, patterns = get_detector().score(transaction)
+    error = "error" in fraud_result
+    return {
+        "transaction": transaction,
+        "fraud_result": fraud_result,
+        "patterns": patterns,
+        "explanation": "Error: Failed to process transaction" if error else fraud_result["explanation"],
+        "error": error
+    }
\ No newline at end of file